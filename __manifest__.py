@@ -48,6 +48,8 @@
         'data/default_config.xml',
         'data/dsr_email_templates.xml',
         'data/dsr_scheduled_actions.xml',
+        'data/signature_scheduled_actions.xml',
+        'data/assignment_scheduled_actions.xml',
 
         # Views - Base Models
         'views/asset_category_views.xml',
@@ -3,11 +3,11 @@
 from odoo import http, fields, _
 from odoo.http import request
 from odoo.exceptions import UserError, ValidationError
-from odoo.addons.school_asset_management.models.security_helpers import SignatureSecurityHelper
+from odoo.addons.school_asset_management.models.security_helpers import SignatureSecurityHelper, TokenAlreadyUsedError
 import logging
-import base64
 from datetime import datetime
 from functools import wraps
+from psycopg2.errors import SerializationFailure
 
 _logger = logging.getLogger(__name__)
 
@@ -222,6 +222,8 @@ def validate_signature_submission(model_name, token_field='checkout_token', toke
 
                 return func(self, token, signature_data, **kwargs)
 
+            except SerializationFailure:
+                raise
             except Exception as e:
                 _logger.exception(f'Error in signature submission decorator for {model_name}')
                 return {
@@ -301,23 +303,24 @@ class StudentAssignmentSignatureController(http.Controller):
                 'consent_liability': ('damage_liability', 'Acknowledgment of liability for damaged/lost assets'),
             }
 
-            for consent_key, (consent_type, purpose) in consent_mappings.items():
-                if consents_given.get(consent_key):
-                    consent_model.log_consent(
-                        consent_type=consent_type,
-                        user_type='parent',
-                        data_subject_name=parent_name,
-                        data_subject_email=assignment.parent_email,
-                        ip_address=ip_address,
-                        user_agent=user_agent,
-                        privacy_version=assignment.privacy_policy_version or '1.0',
-                        student_assignment_id=assignment.id,
-                        purpose=purpose,
-                        consent_method='online'
-                    )
-
-            # Save signature
-            assignment._save_checkout_signature(signature_data, parent_name, ip_address)
+            with request.env.cr.savepoint():
+                for consent_key, (consent_type, purpose) in consent_mappings.items():
+                    if consents_given.get(consent_key):
+                        consent_model.log_consent(
+                            consent_type=consent_type,
+                            user_type='parent',
+                            data_subject_name=parent_name,
+                            data_subject_email=assignment.parent_email,
+                            ip_address=ip_address,
+                            user_agent=user_agent,
+                            privacy_version=assignment.privacy_policy_version or '1.0',
+                            student_assignment_id=assignment.id,
+                            purpose=purpose,
+                            consent_method='online'
+                        )
+
+                # Save signature; a lost token claim also discards the consents above
+                assignment._save_checkout_signature(signature_data, parent_name, ip_address)
 
             # Log successful signature in security audit
             request.env['asset.security.audit.log'].sudo().log_signature_attempt(
@@ -337,6 +340,11 @@ class StudentAssignmentSignatureController(http.Controller):
                 'message': _('Thank you! Your signature has been recorded successfully. You will receive a confirmation email shortly.'),
             }
 
+        except TokenAlreadyUsedError:
+            return {'success': False, 'error': _('This document has already been signed.')}
+        except SerializationFailure:
+            # A concurrent submission claimed the token; let Odoo retry the request
+            raise
         except Exception as e:
             _logger.exception('Error submitting checkout signature')
             return {
@@ -411,6 +419,11 @@ class StudentAssignmentSignatureController(http.Controller):
                 'message': _('Thank you for acknowledging the damage report. You will receive a confirmation email with the damage assessment details.'),
             }
 
+        except TokenAlreadyUsedError:
+            return {'success': False, 'error': _('This document has already been signed.')}
+        except SerializationFailure:
+            # A concurrent submission claimed the token; let Odoo retry the request
+            raise
         except Exception as e:
             _logger.error('Error submitting damage acknowledgment: %s', str(e))
             return {
@@ -508,7 +521,7 @@ class DamageCaseApprovalController(http.Controller):
                 pdf_attachment = request.env['ir.attachment'].sudo().create({
                     'name': f'Damage_Case_Approval_{assignment.name}.pdf',
                     'type': 'binary',
-                    'datas': base64.b64encode(pdf_content),
+                    'raw': pdf_content,
                     'res_model': 'asset.damage.case',
                     'res_id': assignment.id,
                     'mimetype': 'application/pdf',
@@ -607,23 +620,24 @@ class TeacherAssignmentSignatureController(http.Controller):
                 'consent_liability': ('damage_liability', 'Acknowledgment of liability for damaged/lost assets'),
             }
 
-            for consent_key, (consent_type, purpose) in consent_mappings.items():
-                if consents_given.get(consent_key):
-                    consent_model.log_consent(
-                        consent_type=consent_type,
-                        user_type='teacher',
-                        data_subject_name=teacher_name,
-                        data_subject_email=assignment.teacher_email,
-                        ip_address=ip_address,
-                        user_agent=user_agent,
-                        privacy_version='1.0',
-                        teacher_assignment_id=assignment.id,
-                        purpose=purpose,
-                        consent_method='online'
-                    )
-
-            # Save signature
-            assignment._save_checkout_signature(signature_data, ip_address)
+            with request.env.cr.savepoint():
+                for consent_key, (consent_type, purpose) in consent_mappings.items():
+                    if consents_given.get(consent_key):
+                        consent_model.log_consent(
+                            consent_type=consent_type,
+                            user_type='teacher',
+                            data_subject_name=teacher_name,
+                            data_subject_email=assignment.teacher_email,
+                            ip_address=ip_address,
+                            user_agent=user_agent,
+                            privacy_version='1.0',
+                            teacher_assignment_id=assignment.id,
+                            purpose=purpose,
+                            consent_method='online'
+                        )
+
+                # Save signature; a lost token claim also discards the consents above
+                assignment._save_checkout_signature(signature_data, ip_address)
 
             # Log successful signature in security audit
             request.env['asset.security.audit.log'].sudo().log_signature_attempt(
@@ -643,6 +657,11 @@ class TeacherAssignmentSignatureController(http.Controller):
                 'message': _('Thank you! Your signature has been recorded successfully. You will receive a confirmation email shortly.'),
             }
 
+        except TokenAlreadyUsedError:
+            return {'success': False, 'error': _('This document has already been signed.')}
+        except SerializationFailure:
+            # A concurrent submission claimed the token; let Odoo retry the request
+            raise
         except Exception as e:
             _logger.exception('Error submitting teacher checkout signature')
             return {
@@ -713,6 +732,11 @@ class TeacherAssignmentSignatureController(http.Controller):
                 'message': _('Thank you for acknowledging the damage report. You will receive a confirmation email with the damage assessment details.'),
             }
 
+        except TokenAlreadyUsedError:
+            return {'success': False, 'error': _('This document has already been signed.')}
+        except SerializationFailure:
+            # A concurrent submission claimed the token; let Odoo retry the request
+            raise
         except Exception as e:
             _logger.error('Error submitting teacher damage acknowledgment: %s', str(e))
             return {
@@ -817,7 +841,7 @@ class InspectionDamageSignatureController(http.Controller):
                 pdf_attachment = request.env['ir.attachment'].sudo().create({
                     'name': f'Inspection_Damage_Report_{assignment.asset_id.asset_code}_{assignment.inspection_date}.pdf',
                     'type': 'binary',
-                    'datas': base64.b64encode(pdf_content),
+                    'raw': pdf_content,
                     'res_model': 'asset.inspection',
                     'res_id': assignment.id,
                     'mimetype': 'application/pdf',
@@ -3,6 +3,7 @@
 from . import asset_category
 from . import asset_location
 from . import asset_asset
+from . import asset_assignment_mixin
 from . import asset_teacher_assignment
 from . import asset_student_assignment
 from . import asset_inspection
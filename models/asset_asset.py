@@ -139,7 +139,7 @@ class AssetAsset(models.Model):
         ('retired', 'Retired'),
         ('lost', 'Lost'),
     ], string='Status', default='available', required=True, tracking=True,
-        help='Current status of the asset')
+        index=True, help='Current status of the asset')
 
     condition_rating = fields.Selection([
         ('excellent', 'Excellent'),
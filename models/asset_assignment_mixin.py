@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from odoo import models, fields, api, tools, _
+from odoo.tools import sql
+
+from .security_helpers import TOKEN_FIELDS, TokenAlreadyUsedError
+
+_logger = logging.getLogger(__name__)
+
+# Pending flag of each signed document kind
+_PENDING_FIELDS = {
+    'checkout': 'checkout_pdf_pending',
+    'damage': 'damage_pdf_pending',
+}
+
+
+class AssetAssignmentMixin(models.AbstractModel):
+    """Signature and scheduling helpers shared by student and teacher assignments.
+
+    Inheriting models define:
+        _signed_pdf_cron: XML ID of the cron generating their signed PDFs
+        _signed_documents: {kind: {'pdf_field', 'report', 'report_template',
+            'filename_prefix', 'mail_template'}} for 'checkout' and 'damage'
+        _signed_mail_fields: Fields rendered by the confirmation emails
+    """
+    _name = 'asset.assignment.mixin'
+    _description = 'Asset Assignment Mixin'
+
+    _signed_pdf_cron = None
+    _signed_documents = {}
+    _signed_mail_fields = ['name']
+
+    checkout_pdf_pending = fields.Boolean(
+        string='Checkout PDF Pending',
+        default=False,
+        readonly=True,
+        copy=False,
+        help='Signed checkout waiver PDF and confirmation email are queued for generation'
+    )
+    damage_pdf_pending = fields.Boolean(
+        string='Damage PDF Pending',
+        default=False,
+        readonly=True,
+        copy=False,
+        help='Signed damage report PDF and confirmation email are queued for generation'
+    )
+
+    def init(self):
+        """Replace the plain signature token indexes of older versions.
+
+        The token fields use ``index='btree_not_null'`` so only rows that
+        carry a token are indexed; used tokens stay in the index because the
+        signature pages must still recognise them. Older versions created a
+        full btree under the same name, which the ORM would keep as is, so
+        it is dropped here and recreated as a partial index.
+
+        Also index the expiry of pending (issued, unused) links and bring
+        the stored state column back in line with status.
+        """
+        if self._abstract:
+            return
+        for column in ('checkout_token', 'damage_report_token'):
+            index_name = f'{self._table}__{column}_index'
+            self.env.cr.execute(
+                "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname = %s",
+                (self._table, index_name),
+            )
+            row = self.env.cr.fetchone()
+            if row and ' WHERE ' not in row[0]:
+                sql.drop_index(self.env.cr, index_name, self._table)
+
+        # Expiry lookups only ever concern links that are issued and not yet used
+        for kind, prefix in (('checkout', 'checkout_token'), ('damage', 'damage_report_token')):
+            sql.create_index(
+                self.env.cr,
+                f'{self._table}_pending_{kind}_idx',
+                self._table,
+                [f'{prefix}_expiry'],
+                where=f'{prefix} IS NOT NULL AND {prefix}_used IS NOT TRUE',
+            )
+
+        # state used to be written separately from status; the ORM only fills
+        # a related column when it creates it, so realign existing rows
+        self.env.cr.execute(
+            f"UPDATE {self._table} SET state = status WHERE state IS DISTINCT FROM status"
+        )
+
+    @tools.ormcache('param', 'default')
+    def _get_signature_config(self, param, default=False):
+        """Return a signature-related system parameter.
+
+        Cached per registry; writing any ir.config_parameter clears the
+        cache so changes propagate to all workers.
+        """
+        return self.env['ir.config_parameter'].sudo().get_param(param, default=default)
+
+    @api.model
+    def _cron_update_overdue_status(self):
+        """Refresh is_overdue/days_overdue for all assignments in one UPDATE.
+
+        The stored values only follow their dependencies, not the calendar,
+        so this daily job recomputes them set-based in PostgreSQL instead of
+        recomputing every assignment in Python.
+        """
+        self.flush_model(['status', 'return_type', 'expected_return_date', 'is_overdue', 'days_overdue'])
+        overdue_condition = (
+            "status = 'checked_out' AND return_type = 'specific_date' "
+            "AND expected_return_date IS NOT NULL AND expected_return_date < %(today)s"
+        )
+        self.env.cr.execute(f"""
+            UPDATE {self._table} AS a
+               SET is_overdue = v.overdue, days_overdue = v.days
+              FROM (
+                    SELECT id,
+                           ({overdue_condition}) AS overdue,
+                           CASE WHEN {overdue_condition}
+                                THEN %(today)s - expected_return_date ELSE 0 END AS days
+                      FROM {self._table}
+                   ) AS v
+             WHERE a.id = v.id
+               AND (a.is_overdue IS DISTINCT FROM v.overdue OR a.days_overdue IS DISTINCT FROM v.days)
+        """, {'today': fields.Date.today()})
+        _logger.info("Overdue status refreshed on %s %s records", self.env.cr.rowcount, self._name)
+        self.invalidate_model(['is_overdue', 'days_overdue'])
+
+    def _claim_token(self, token_type):
+        """Mark the token as used, unless a concurrent request already did.
+
+        Requests run in REPEATABLE READ, so when two submissions race the
+        second UPDATE fails with a SerializationFailure; that error must be
+        left to propagate so Odoo retries the request, which then sees the
+        token as used. The conditional UPDATE additionally refuses a token
+        that is already marked used in the current snapshot.
+
+        Raises:
+            TokenAlreadyUsedError: If the token was already consumed
+        """
+        used_field = TOKEN_FIELDS[token_type][1]
+        self.flush_recordset([used_field])
+        self.env.cr.execute(
+            f"UPDATE {self._table} SET {used_field} = TRUE WHERE id = %s AND {used_field} IS NOT TRUE",
+            (self.id,),
+        )
+        if not self.env.cr.rowcount:
+            raise TokenAlreadyUsedError(_('This signature link has already been used.'))
+        self.invalidate_recordset([used_field])
+
+    # ========== Signed PDF Queue ==========
+
+    def _trigger_signed_pdf_generation(self):
+        """Wake up the signed PDF cron so queued documents are generated soon"""
+        cron = self.env.ref(self._signed_pdf_cron, raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger()
+
+    @api.model
+    def _cron_generate_signed_pdfs(self):
+        """
+        Scheduled action generating signed PDFs queued by the signature pages
+        and sending the matching confirmation emails through the mail queue
+        """
+        for kind in self._signed_documents:
+            self._process_pending_pdfs(kind)
+
+    @api.model
+    def _process_pending_pdfs(self, kind):
+        """Generate queued PDFs in one batch and queue confirmation emails.
+
+        If the batch fails, records are retried one by one; records that
+        still fail keep their pending flag and are retried on the next run.
+
+        Args:
+            kind: Signed document kind ('checkout' or 'damage')
+        """
+        pending_field = _PENDING_FIELDS[kind]
+        records = self.search([(pending_field, '=', True)])
+        if not records:
+            return
+
+        try:
+            with self.env.cr.savepoint():
+                records._generate_signed_pdfs(kind)
+            done = records
+        except Exception:
+            _logger.exception("Batch PDF generation failed for %s records, retrying one by one", len(records))
+            done = self.browse()
+            for record in records:
+                try:
+                    with self.env.cr.savepoint():
+                        record._generate_signed_pdfs(kind)
+                    done |= record
+                except Exception:
+                    _logger.exception("PDF generation failed for %s", record.name)
+
+        if not done:
+            return
+        done.write({pending_field: False})
+
+        template = self.env.ref(self._signed_documents[kind]['mail_template'], raise_if_not_found=False)
+        if template:
+            # Render all emails in one pass and create the mail.mail records at once
+            done.fetch(self._signed_mail_fields)
+            template.send_mail_batch(done.ids, force_send=False)
+
+    def _generate_signed_pdfs(self, kind):
+        """Render a signed document for all records and attach the results.
+
+        Args:
+            kind: Signed document kind ('checkout' or 'damage')
+
+        Returns:
+            ir.attachment: The created attachments, in record order
+        """
+        document = self._signed_documents[kind]
+        pdf_field = document['pdf_field']
+
+        # Delete old PDF attachments if they exist
+        self.mapped(pdf_field).sudo().unlink()
+
+        pdfs = self._render_pdfs(document['report'], document['report_template'])
+
+        # Create all attachments at once
+        attachments = self.env['ir.attachment'].sudo().create([{
+            'name': f"{document['filename_prefix']}_{record.name}.pdf",
+            'type': 'binary',
+            'raw': pdfs[record.id],
+            'res_model': self._name,
+            'res_id': record.id,
+            'mimetype': 'application/pdf',
+        } for record in self])
+        # The PDFs now live in the filestore; drop the in-memory copies early
+        del pdfs
+
+        # Link every record to its attachment in a single UPDATE
+        self.flush_recordset([pdf_field])
+        self.env.cr.execute(f"""
+            UPDATE {self._table} AS t
+               SET {pdf_field} = v.attachment_id
+              FROM unnest(%s::int[], %s::int[]) AS v(id, attachment_id)
+             WHERE t.id = v.id
+        """, [self.ids, attachments.ids])
+        self.invalidate_recordset([pdf_field])
+
+        return attachments
+
+    def _render_pdfs(self, report_xmlid, template_xmlid):
+        """Render one PDF per record, using a single wkhtmltopdf run when possible.
+
+        For several records the combined document is split per record using
+        the report outlines; if that is not possible, records are rendered
+        one by one.
+
+        Returns:
+            dict: {record_id: pdf_content}
+        """
+        report_sudo = self.env.ref(report_xmlid).sudo()
+
+        if len(self) > 1:
+            streams = report_sudo._render_qweb_pdf_prepare_streams(
+                template_xmlid, {'report_type': 'pdf'}, res_ids=self.ids
+            )
+            if all(streams.get(res_id, {}).get('stream') for res_id in self.ids):
+                return {res_id: streams[res_id]['stream'].getvalue() for res_id in self.ids}
+
+        return {
+            record.id: report_sudo._render_qweb_pdf(template_xmlid, res_ids=record.ids)[0]
+            for record in self
+        }
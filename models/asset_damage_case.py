@@ -261,17 +261,12 @@ class AssetDamageCase(models.Model):
         # Send approval email with signature link
         template = self.env.ref('school_asset_management.email_template_damage_case_approval', raise_if_not_found=False)
         if template:
-            # Generate mail record WITHOUT force_send, passing email_to explicitly
-            mail_id = template.send_mail(
+            # Queued with email_to passed explicitly; the mail scheduler delivers it
+            template.send_mail(
                 self.id,
                 force_send=False,
                 email_values={'email_to': self.approver_email}
             )
-            # Now send the mail
-            if mail_id:
-                mail = self.env['mail.mail'].sudo().browse(mail_id)
-                if mail.exists():
-                    mail.send()
 
         self.message_post(
             body=_('Case submitted for approval. Approval request sent to %s') % self.approver_email,
@@ -423,17 +418,12 @@ class AssetDamageCase(models.Model):
         # Resend email
         template = self.env.ref('school_asset_management.email_template_damage_case_approval', raise_if_not_found=False)
         if template:
-            # Generate mail record WITHOUT force_send, passing email_to explicitly
-            mail_id = template.send_mail(
+            # Queued with email_to passed explicitly; the mail scheduler delivers it
+            template.send_mail(
                 self.id,
                 force_send=False,
                 email_values={'email_to': self.approver_email}
             )
-            # Now send the mail
-            if mail_id:
-                mail = self.env['mail.mail'].sudo().browse(mail_id)
-                if mail.exists():
-                    mail.send()
 
         self.message_post(
             body=_('Approval request resent to %s') % self.approver_email
@@ -447,7 +437,7 @@ class AssetDamageCase(models.Model):
             raise UserError(_('No approval link available. Please submit for approval first.'))
 
         # Get base URL
-        base_url = self.env['ir.config_parameter'].sudo().get_param('web.base.url')
+        base_url = self.get_base_url()
         approval_url = f"{base_url}/damage/approve/{self.approval_token}"
 
         return {
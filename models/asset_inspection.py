@@ -491,7 +491,7 @@ class AssetInspection(models.Model):
             raise UserError(_('No damage signature link available. Please send the damage acknowledgment first.'))
 
         # Get base URL
-        base_url = self.env['ir.config_parameter'].sudo().get_param('web.base.url')
+        base_url = self.get_base_url()
         signature_url = f"{base_url}/sign/inspection/damage/{self.damage_token}"
 
         return {
@@ -93,22 +93,25 @@ class AssetMovement(models.Model):
     @api.depends('asset_id', 'movement_date', 'reason')
     def _compute_display_name(self):
         """Compute display name for movement record"""
+        # Build the selection lookup and format dates once for the whole batch
+        reason_dict = dict(self._fields['reason'].selection)
+        to_string = fields.Datetime.to_string
+        date_strs = {
+            date: to_string(date)
+            for date in set(self.mapped('movement_date'))
+        }
         for movement in self:
             if movement.asset_id and movement.movement_date:
-                reason_dict = dict(movement._fields['reason'].selection)
                 reason_name = reason_dict.get(movement.reason, '')
-                date_str = fields.Datetime.to_string(movement.movement_date)
+                date_str = date_strs[movement.movement_date]
                 movement.display_name = f"{movement.asset_id.asset_code} - {reason_name} - {date_str}"
             else:
                 movement.display_name = _('New Movement')
 
     def name_get(self):
         """Custom name_get to display meaningful information"""
-        result = []
-        for movement in self:
-            name = movement.display_name or _('Movement')
-            result.append((movement.id, name))
-        return result
+        default_name = _('Movement')
+        return [(movement.id, movement.display_name or default_name) for movement in self]
 
     @api.model
     def create_movement(self, asset_id, from_location=None, to_location=None,
@@ -1,25 +1,57 @@
 # -*- coding: utf-8 -*-
 
-import base64
-import secrets
 import logging
-import hmac
-import hashlib
+from collections import defaultdict
 from datetime import timedelta
 from typing import Tuple
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError, UserError
 
+from . import signature_watermark
+from .security_helpers import (
+    FALLBACK_SIGNATURE_SECRET,
+    TOKEN_EXPIRY_PARAMS,
+    TOKEN_FIELDS,
+    generate_hmac_token,
+    should_log_security_event,
+    tokens_match,
+    verify_hmac_token,
+)
+
 _logger = logging.getLogger(__name__)
 
+# Condition ranking used to detect worsened condition at check-in
+_CONDITION_ORDER = {'excellent': 4, 'good': 3, 'fair': 2, 'poor': 1, 'broken': 0}
+
 
 class AssetStudentAssignment(models.Model):
     """Student Asset Assignment Model"""
     _name = 'asset.student.assignment'
     _description = 'Student Asset Assignment'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'asset.assignment.mixin']
     _order = 'checkout_date desc'
 
+    # Signed documents generated by the signed PDF cron (asset.assignment.mixin)
+    _signed_pdf_cron = 'school_asset_management.ir_cron_generate_signed_pdfs'
+    _signed_documents = {
+        'checkout': {
+            'pdf_field': 'checkout_signed_pdf_id',
+            'report': 'school_asset_management.action_report_student_checkout_waiver',
+            'report_template': 'school_asset_management.report_signed_checkout_waiver',
+            'filename_prefix': 'Checkout_Waiver',
+            'mail_template': 'school_asset_management.email_template_student_checkout_confirmation',
+        },
+        'damage': {
+            'pdf_field': 'damage_signed_pdf_id',
+            'report': 'school_asset_management.action_report_student_damage_report',
+            'report_template': 'school_asset_management.report_signed_damage_report',
+            'filename_prefix': 'Damage_Report',
+            'mail_template': 'school_asset_management.email_template_student_damage_acknowledgment',
+        },
+    }
+    # The confirmation templates address each mail to object.parent_email
+    _signed_mail_fields = ['name', 'parent_email', 'parent_name']
+
     name = fields.Char(
         string='Reference',
         compute='_compute_name',
@@ -87,12 +119,13 @@ class AssetStudentAssignment(models.Model):
         ('cancelled', 'Cancelled'),
     ], string='Status', default='draft', required=True, tracking=True)
 
-    state = fields.Selection([
-        ('draft', 'Draft'),
-        ('checked_out', 'Checked Out'),
-        ('inspected', 'Inspected'),
-        ('checked_in', 'Checked In'),
-    ], string='State', default='draft', tracking=True)
+    # Kept for backward compatibility (search domains); mirrors status so
+    # state changes are written and tracked only once
+    state = fields.Selection(
+        related='status',
+        store=True,
+        string='State'
+    )
 
     # Asset Lines
     asset_line_ids = fields.One2many(
@@ -173,7 +206,7 @@ class AssetStudentAssignment(models.Model):
         string='Checkout Token',
         readonly=True,
         copy=False,
-        index=True,
+        index='btree_not_null',
         help='Unique token for checkout signature link'
     )
     checkout_token_expiry = fields.Datetime(
@@ -207,7 +240,7 @@ class AssetStudentAssignment(models.Model):
         string='Damage Token',
         readonly=True,
         copy=False,
-        index=True,
+        index='btree_not_null',
         help='Unique token for damage report signature link'
     )
     damage_report_token_expiry = fields.Datetime(
@@ -274,20 +307,20 @@ class AssetStudentAssignment(models.Model):
         string='Days Overdue'
     )
     total_damage_cost = fields.Float(
-        compute='_compute_total_damage_cost',
+        compute='_compute_damage_summary',
         string='Total Damage Cost',
         digits='Product Price',
         store=True
     )
     total_repair_cost = fields.Float(
-        compute='_compute_total_repair_cost',
+        compute='_compute_damage_summary',
         string='Total Repair Cost',
         digits='Product Price',
         store=True,
         help='Total repair cost for all damaged assets'
     )
     has_damage = fields.Boolean(
-        compute='_compute_has_damage',
+        compute='_compute_damage_summary',
         store=True,
         string='Has Damage',
         help='True if any asset line has damage'
@@ -297,7 +330,17 @@ class AssetStudentAssignment(models.Model):
         ('pending', 'Waiting for Signature'),
         ('signed', 'Signed'),
         ('expired', 'Link Expired'),
-    ], compute='_compute_checkout_signature_status', string='Signature Status', store=True)
+    ], compute='_compute_checkout_signature_status', string='Signature Status')
+    checkout_sign_url = fields.Char(
+        string='Checkout Signature Link',
+        compute='_compute_sign_urls',
+        help='Public link to the checkout signature page'
+    )
+    damage_sign_url = fields.Char(
+        string='Damage Signature Link',
+        compute='_compute_sign_urls',
+        help='Public link to the damage acknowledgment page'
+    )
 
     # Damage Cases
     damage_case_ids = fields.One2many(
@@ -319,11 +362,15 @@ class AssetStudentAssignment(models.Model):
         Format: [Student ID] Student Name - Checkout Date
         Example: [TD-1234567] John Smith - 2025-10-20
         """
+        default_name = _('New Assignment')
         for record in self:
             if record.student_name and record.checkout_date:
-                record.name = f"{record.student_name} - {record.checkout_date}"
+                new_name = f"{record.student_name} - {record.checkout_date}"
             else:
-                record.name = _('New Assignment')
+                new_name = default_name
+            # Skip no-op assignments so dependents of name are not invalidated
+            if record.name != new_name:
+                record.name = new_name
 
     @api.depends('student_id.mother_id', 'student_id.father_id',
                  'student_id.mother_id.email', 'student_id.mother_id.name',
@@ -339,136 +386,187 @@ class AssetStudentAssignment(models.Model):
         This ensures asset-related communications reach at least one parent.
         Follows Odoo 19 best practices with proper @api.depends decorator.
         """
+        # Warm the cache for all parents at once instead of per-record reads
+        parents = self.mapped('student_id.mother_id') | self.mapped('student_id.father_id')
+        parents.mapped('email')
+        parents.mapped('name')
+
+        # Collect log information and emit one summary per batch
+        from_mother = from_father = 0
+        missing_students = []
+
         for record in self:
             # Initialize defaults
             parent_email = False
             parent_name = False
 
-            if record.student_id:
+            student = record.student_id
+            if student:
+                mother = student.mother_id
+                father = student.father_id
                 # Prefer mother's contact (primary contact as per design)
-                if record.student_id.mother_id and record.student_id.mother_id.email:
-                    parent_email = record.student_id.mother_id.email
-                    parent_name = record.student_id.mother_id.name
-                    _logger.debug(
-                        "Assignment %s: Using mother's contact - %s (%s)",
-                        record.id, parent_name, parent_email
-                    )
+                if mother and mother.email:
+                    parent_email = mother.email
+                    parent_name = mother.name
+                    from_mother += 1
                 # Fallback to father's contact
-                elif record.student_id.father_id and record.student_id.father_id.email:
-                    parent_email = record.student_id.father_id.email
-                    parent_name = record.student_id.father_id.name
-                    _logger.debug(
-                        "Assignment %s: Using father's contact - %s (%s)",
-                        record.id, parent_name, parent_email
-                    )
+                elif father and father.email:
+                    parent_email = father.email
+                    parent_name = father.name
+                    from_father += 1
                 else:
-                    _logger.warning(
-                        "Assignment %s: No parent email found for student %s",
-                        record.id, record.student_id.student_id
-                    )
-
-            # Only update if not manually overridden
-            # This allows users to manually set different email if needed
-            if not record.parent_email or record.parent_email != parent_email:
+                    missing_students.append(student.student_id)
+
+            # Only write actual changes to avoid tracking entries and recompute
+            # cascades; an empty result clears the previous student's contact
+            if record.parent_email != parent_email:
                 record.parent_email = parent_email
-            if not record.parent_name or record.parent_name != parent_name:
+            if record.parent_name != parent_name:
                 record.parent_name = parent_name
 
+        _logger.debug(
+            "Parent contact computed for %s assignments: %s from mother, %s from father",
+            len(self), from_mother, from_father
+        )
+        if missing_students:
+            _logger.warning(
+                "No parent email found for %s students: %s",
+                len(missing_students), missing_students[:20]
+            )
+
     @api.depends('asset_line_ids')
     def _compute_asset_count(self):
-        """Count assets in assignment"""
+        """Count assets in assignment (one grouped query for saved records)"""
+        counts = dict(self.env['asset.student.line']._read_group(
+            [('assignment_id', 'in', self.filtered('id').ids)],
+            ['assignment_id'],
+            ['__count'],
+        ))
         for record in self:
-            record.asset_count = len(record.asset_line_ids)
+            if record.id:
+                record.asset_count = counts.get(record, 0)
+            else:
+                record.asset_count = len(record.asset_line_ids)
 
     @api.depends('damage_case_ids')
     def _compute_damage_case_count(self):
-        """Count damage cases created from this assignment"""
+        """Count damage cases created from this assignment (one grouped query)"""
+        counts = dict(self.env['asset.damage.case']._read_group(
+            [('student_assignment_id', 'in', self.filtered('id').ids)],
+            ['student_assignment_id'],
+            ['__count'],
+        ))
         for record in self:
-            record.damage_case_count = len(record.damage_case_ids)
+            if record.id:
+                record.damage_case_count = counts.get(record, 0)
+            else:
+                record.damage_case_count = len(record.damage_case_ids)
 
     @api.depends('expected_return_date', 'status', 'return_type')
     def _compute_is_overdue(self):
         """Check if assignment is overdue"""
         today = fields.Date.today()
         for record in self:
+            is_overdue = False
+            days_overdue = 0
             # Only check overdue for specific_date type with checked_out status
-            if record.status == 'checked_out' and record.return_type == 'specific_date' and record.expected_return_date:
-                if record.expected_return_date < today:
-                    record.is_overdue = True
-                    record.days_overdue = (today - record.expected_return_date).days
-                else:
-                    record.is_overdue = False
-                    record.days_overdue = 0
-            else:
-                record.is_overdue = False
-                record.days_overdue = 0
-
-    @api.depends('asset_line_ids.repair_cost')
-    def _compute_total_damage_cost(self):
-        """Calculate total damage/repair cost"""
-        for record in self:
-            record.total_damage_cost = sum(
-                record.asset_line_ids.mapped('repair_cost')
-            )
+            # (draft, checked-in and cancelled assignments are never overdue)
+            if (record.status == 'checked_out' and record.return_type == 'specific_date'
+                    and record.expected_return_date and record.expected_return_date < today):
+                is_overdue = True
+                days_overdue = (today - record.expected_return_date).days
+
+            # Only write stored values that actually change
+            if record.is_overdue != is_overdue:
+                record.is_overdue = is_overdue
+            if record.days_overdue != days_overdue:
+                record.days_overdue = days_overdue
+
+    @api.depends('asset_line_ids.repair_cost', 'asset_line_ids.damage_found')
+    def _compute_damage_summary(self):
+        """Compute damage flag and cost totals in a single pass over the lines"""
+        # Prefetch line values for the whole batch in one read
+        all_lines = self.mapped('asset_line_ids')
+        all_lines.mapped('repair_cost')
+        all_lines.mapped('damage_found')
 
-    @api.depends('asset_line_ids.damage_found')
-    def _compute_has_damage(self):
-        """Check if any asset has damage"""
         for record in self:
-            record.has_damage = any(record.asset_line_ids.mapped('damage_found'))
-
-    @api.depends('asset_line_ids.repair_cost')
-    def _compute_total_repair_cost(self):
-        """Compute total repair cost from all damaged assets"""
-        for record in self:
-            record.total_repair_cost = sum(record.asset_line_ids.mapped('repair_cost'))
+            total_cost = 0.0
+            has_damage = False
+            for line in record.asset_line_ids:
+                total_cost += line.repair_cost
+                has_damage = has_damage or line.damage_found
+            record.total_damage_cost = total_cost
+            record.total_repair_cost = total_cost
+            record.has_damage = has_damage
 
     @api.depends('checkout_token', 'checkout_token_expiry', 'checkout_token_used')
     def _compute_checkout_signature_status(self):
         """Compute checkout signature status"""
+        now = fields.Datetime.now()
         for record in self:
             if not record.checkout_token:
                 record.checkout_signature_status = 'not_sent'
             elif record.checkout_token_used:
                 record.checkout_signature_status = 'signed'
-            elif record.checkout_token_expiry and record.checkout_token_expiry < fields.Datetime.now():
+            elif record.checkout_token_expiry and record.checkout_token_expiry < now:
                 record.checkout_signature_status = 'expired'
             else:
                 record.checkout_signature_status = 'pending'
 
+    @api.depends('checkout_token', 'damage_report_token')
+    def _compute_sign_urls(self):
+        """Build the public signature links"""
+        for record in self:
+            # Per record, so website-specific base URLs apply
+            base_url = record.get_base_url()
+            record.checkout_sign_url = (
+                f"{base_url}/sign/student/checkout/{record.checkout_token}"
+                if record.checkout_token else False
+            )
+            record.damage_sign_url = (
+                f"{base_url}/sign/student/damage/{record.damage_report_token}"
+                if record.damage_report_token else False
+            )
+
     @api.depends('consent_log_ids.consent_given', 'consent_log_ids.consent_withdrawn')
     def _compute_consent_status(self):
         """
         PDPA Compliance: Check if valid consents exist
         Checks for active, non-withdrawn consent records
         """
+        # Prefetch consent fields for the whole batch in one read
+        all_logs = self.mapped('consent_log_ids')
+        all_logs.mapped('consent_type')
+        all_logs.mapped('is_expired')
+
         for record in self:
-            # Check data collection consent
-            data_consent = record.consent_log_ids.filtered(
-                lambda c: c.consent_type in ('data_collection', 'all')
-                and c.consent_given
-                and not c.consent_withdrawn
-                and not c.is_expired
-            )
-            record.has_data_collection_consent = bool(data_consent)
-
-            # Check digital signature consent
-            signature_consent = record.consent_log_ids.filtered(
-                lambda c: c.consent_type in ('digital_signature', 'all')
-                and c.consent_given
-                and not c.consent_withdrawn
-                and not c.is_expired
-            )
-            record.has_digital_signature_consent = bool(signature_consent)
+            has_data = has_signature = False
+            for consent in record.consent_log_ids:
+                if not consent.consent_given or consent.consent_withdrawn or consent.is_expired:
+                    continue
+                consent_type = consent.consent_type
+                if consent_type in ('data_collection', 'all'):
+                    has_data = True
+                if consent_type in ('digital_signature', 'all'):
+                    has_signature = True
+                if has_data and has_signature:
+                    break
+            record.has_data_collection_consent = has_data
+            record.has_digital_signature_consent = has_signature
 
     def _compute_watermarked_signatures(self):
         """
         Generate watermarked versions of signatures for display
         SECURITY: Original signatures are protected, only watermarked versions shown to staff
         """
-        from . import signature_watermark
-
-        for record in self:
+        # Records without any signature (most rows of a list view) are reset in bulk
+        signed = self.filtered(lambda r: r.checkout_student_signature or r.damage_signature)
+        (self - signed).update({
+            'checkout_student_signature_watermarked': False,
+            'damage_signature_watermarked': False,
+        })
+        for record in signed:
             # Watermark checkout signature
             if record.checkout_student_signature:
                 record.checkout_student_signature_watermarked = signature_watermark.add_watermark_to_signature(
@@ -519,24 +617,27 @@ class AssetStudentAssignment(models.Model):
                 'Please send the signature request to parent first.'
             ))
 
-        # Update asset status
-        for line in self.asset_line_ids:
-            line.asset_id.write({
-                'status': 'assigned_student',
-                'custodian_id': False,  # Students are not employees
-            })
+        # Update asset status in a single write
+        self.asset_line_ids.asset_id.write({
+            'status': 'assigned_student',
+            'custodian_id': False,  # Students are not employees
+        })
 
         self.write({
             'status': 'checked_out',
-            'state': 'checked_out',
         })
 
     def action_checkin(self):
         """Process check-in - Option 1A: signature required only if damage"""
         self.ensure_one()
 
+        # Load line conditions and assets in one read each
+        lines = self.asset_line_ids
+        lines.mapped('checkin_condition')
+        lines.mapped('asset_id')
+
         # Check if all assets have check-in condition documented
-        for line in self.asset_line_ids:
+        for line in lines:
             if not line.checkin_condition:
                 raise UserError(_(
                     'Please document the check-in condition for all assets.'
@@ -549,16 +650,18 @@ class AssetStudentAssignment(models.Model):
                 'Please send the damage report to parent first.'
             ))
 
-        # Update asset status
-        for line in self.asset_line_ids:
-            line.asset_id.write({
+        # Update asset status with one write per check-in condition
+        assets_by_condition = defaultdict(lambda: self.env['asset.asset'])
+        for line in lines:
+            assets_by_condition[line.checkin_condition] |= line.asset_id
+        for condition, assets in assets_by_condition.items():
+            assets.write({
                 'status': 'available',
-                'condition_rating': line.checkin_condition,
+                'condition_rating': condition,
             })
 
         self.write({
             'status': 'checked_in',
-            'state': 'checked_in',
             'actual_return_date': fields.Date.today(),
         })
 
@@ -618,48 +721,31 @@ class AssetStudentAssignment(models.Model):
             - Uses HMAC-SHA256 for tamper-proof tokens
             - Secret key stored in ir.config_parameter
             - Includes record ID, timestamp, and random salt
+            - Compact struct-packed payload with raw digest, base64url encoded
         """
         self.ensure_one()
 
         # Get secret key from config (auto-generated on install)
-        secret_key = self.env['ir.config_parameter'].sudo().get_param(
+        secret_key = self._get_signature_config(
             'school_asset.signature_secret',
-            default='fallback_secret_DO_NOT_USE_IN_PRODUCTION'
+            FALLBACK_SIGNATURE_SECRET
         )
 
-        if secret_key == 'fallback_secret_DO_NOT_USE_IN_PRODUCTION':
+        if secret_key == FALLBACK_SIGNATURE_SECRET:
             _logger.warning('Using fallback secret key! Generate a proper one in System Parameters.')
 
         # Get expiry days from config
-        expiry_param_map = {
-            'checkout': 'school_asset.checkout_token_expiry_days',
-            'damage': 'school_asset.damage_token_expiry_days',
-            'approval': 'school_asset.approval_token_expiry_days',
-        }
-        expiry_days = int(self.env['ir.config_parameter'].sudo().get_param(
-            expiry_param_map.get(token_type, 'school_asset.checkout_token_expiry_days'),
-            default='7'
+        expiry_days = int(self._get_signature_config(
+            TOKEN_EXPIRY_PARAMS.get(token_type, TOKEN_EXPIRY_PARAMS['checkout']),
+            '7'
         ))
 
-        # Generate timestamp and salt
-        timestamp = str(int(fields.Datetime.now().timestamp()))
-        salt = secrets.token_hex(16)
-
-        # Create message: record_id|timestamp|salt|token_type
-        message = f"{self.id}|{timestamp}|{salt}|{token_type}"
-
-        # Generate HMAC-SHA256 signature
-        signature = hmac.new(
-            secret_key.encode('utf-8'),
-            message.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
-
-        # Token format: message.signature (URL-safe)
-        token = f"{message}.{signature}"
+        # Token payload: record_id, timestamp, random salt, token type (binary + base64url)
+        now = fields.Datetime.now()
+        token = generate_hmac_token(secret_key, self.id, token_type, int(now.timestamp()))
 
         # Calculate expiry
-        expiry = fields.Datetime.now() + timedelta(days=expiry_days)
+        expiry = now + timedelta(days=expiry_days)
 
         return token, expiry
 
@@ -677,53 +763,11 @@ class AssetStudentAssignment(models.Model):
         """
         self.ensure_one()
 
-        try:
-            # Split token into message and signature
-            if '.' not in token:
-                return False, 'invalid'
-
-            message, received_signature = token.rsplit('.', 1)
-
-            # Parse message: record_id|timestamp|salt|token_type
-            parts = message.split('|')
-            if len(parts) != 4:
-                return False, 'invalid'
-
-            record_id, timestamp, salt, msg_token_type = parts
-
-            # Verify record ID matches
-            if int(record_id) != self.id:
-                _logger.warning(f'Token record ID mismatch: expected {self.id}, got {record_id}')
-                return False, 'invalid'
-
-            # Verify token type matches
-            if msg_token_type != token_type:
-                _logger.warning(f'Token type mismatch: expected {token_type}, got {msg_token_type}')
-                return False, 'invalid'
-
-            # Get secret key
-            secret_key = self.env['ir.config_parameter'].sudo().get_param(
-                'school_asset.signature_secret',
-                default='fallback_secret_DO_NOT_USE_IN_PRODUCTION'
-            )
-
-            # Calculate expected signature
-            expected_signature = hmac.new(
-                secret_key.encode('utf-8'),
-                message.encode('utf-8'),
-                hashlib.sha256
-            ).hexdigest()
-
-            # Constant-time comparison to prevent timing attacks
-            if not secrets.compare_digest(received_signature, expected_signature):
-                _logger.warning(f'HMAC signature verification failed for record {self.id}')
-                return False, 'tampered'
-
-            return True, 'valid'
-
-        except Exception as e:
-            _logger.error(f'Error verifying HMAC token: {e}')
-            return False, 'invalid'
+        secret_key = self._get_signature_config(
+            'school_asset.signature_secret',
+            FALLBACK_SIGNATURE_SECRET
+        )
+        return verify_hmac_token(secret_key, token, self.id, token_type)
 
     def action_send_checkout_signature_request(self):
         """Generate HMAC token and send checkout signature request email to parent"""
@@ -746,31 +790,19 @@ class AssetStudentAssignment(models.Model):
             raise_if_not_found=False
         )
         if template:
-            _logger.info(f"=== TEMPLATE FOUND: ID={template.id}, Name={template.name}")
-            _logger.info(f"=== parent_email from record: {self.parent_email}")
+            _logger.info(
+                "Sending checkout signature request for %s (template %s) to %s",
+                self.name, template.id, self.parent_email
+            )
 
-            # Generate mail record WITHOUT force_send, passing email_to explicitly
+            # force_send sends the mail inline, no need to re-browse mail.mail
             mail_id = template.send_mail(
                 self.id,
-                force_send=False,
+                force_send=True,
                 email_values={'email_to': self.parent_email}
             )
-            _logger.info(f"=== send_mail() returned mail_id={mail_id}")
-
-            # Now send the mail
-            if mail_id:
-                mail = self.env['mail.mail'].sudo().browse(mail_id)
-                if mail.exists():
-                    _logger.info(f"=== MAIL RECORD FOUND: id={mail.id}, email_to={mail.email_to}")
-                    _logger.info(f"=== MAIL state={mail.state}, body_html length={len(mail.body_html) if mail.body_html else 0}")
-
-                    _logger.info("=== Calling mail.send()...")
-                    mail.send()
-                    _logger.info("=== mail.send() completed")
-                else:
-                    _logger.error("=== MAIL RECORD NOT FOUND!")
-            else:
-                _logger.error("=== send_mail() returned None/False!")
+            if not mail_id:
+                _logger.error("Checkout signature request mail was not created for %s", self.name)
 
             self.message_post(
                 body=_('Checkout signature request sent to %s') % self.parent_email
@@ -796,6 +828,8 @@ class AssetStudentAssignment(models.Model):
     def action_send_damage_report(self):
         """Generate HMAC token and send damage report email to parent"""
         self.ensure_one()
+        # Load the fields used by the checks, the template and the chatter in one query
+        self.fetch(['has_damage', 'parent_email', 'total_damage_cost', 'name', 'student_name'])
         if not self.has_damage:
             raise UserError(_('No damage found. Cannot send damage report.'))
         if not self.parent_email:
@@ -817,15 +851,12 @@ class AssetStudentAssignment(models.Model):
             raise_if_not_found=False
         )
         if template:
-            mail_id = template.send_mail(
+            # Queued; the mail scheduler cron sends it in batch
+            template.send_mail(
                 self.id,
                 force_send=False,
                 email_values={'email_to': self.parent_email}
             )
-            if mail_id:
-                mail = self.env['mail.mail'].sudo().browse(mail_id)
-                if mail.exists():
-                    mail.send()
 
             self.message_post(
                 body=_('⚠️ Damage report sent to %s. Total cost: %.2f THB') % (
@@ -881,9 +912,7 @@ class AssetStudentAssignment(models.Model):
         if not self.checkout_token:
             raise UserError(_('Please send signature request first to generate link.'))
 
-        # Get base URL
-        base_url = self.env['ir.config_parameter'].sudo().get_param('web.base.url')
-        link = f"{base_url}/sign/student/checkout/{self.checkout_token}"
+        link = self.checkout_sign_url
         expiry = self.checkout_token_expiry.strftime('%Y-%m-%d %H:%M') if self.checkout_token_expiry else 'N/A'
 
         # Return client action to auto-copy to clipboard
@@ -902,9 +931,7 @@ class AssetStudentAssignment(models.Model):
         if not self.damage_report_token:
             raise UserError(_('Please send damage report first to generate link.'))
 
-        # Get base URL
-        base_url = self.env['ir.config_parameter'].sudo().get_param('web.base.url')
-        link = f"{base_url}/sign/student/damage/{self.damage_report_token}"
+        link = self.damage_sign_url
         expiry = self.damage_report_token_expiry.strftime('%Y-%m-%d %H:%M') if self.damage_report_token_expiry else 'N/A'
 
         # Return client action to auto-copy to clipboard
@@ -921,45 +948,55 @@ class AssetStudentAssignment(models.Model):
         """Create damage case from student check-in with damage"""
         self.ensure_one()
 
-        # Find damaged assets
-        damaged_lines = self.asset_line_ids.filtered(lambda l: l.damage_found)
+        # Find damaged assets in SQL instead of loading every line
+        damaged_lines = self.env['asset.student.line'].search([
+            ('assignment_id', '=', self.id),
+            ('damage_found', '=', True),
+        ])
         if not damaged_lines:
             raise UserError(_('No damaged assets found in this check-in.'))
 
-        # If only one damaged asset, create case directly
-        if len(damaged_lines) == 1:
-            line = damaged_lines[0]
+        # Load the fields used below for all lines at once
+        damaged_lines.fetch(['asset_id', 'damage_description', 'repair_cost', 'checkin_photo_ids'])
+
+        damage_date = self.actual_return_date or fields.Date.today()
+        vals_list = []
+        for line in damaged_lines:
             vals = {
                 'damage_source': 'checkin_student',
                 'student_assignment_id': self.id,
                 'asset_id': line.asset_id.id,
                 'damage_description': line.damage_description or '',
-                'damage_date': self.actual_return_date or fields.Date.today(),
+                'damage_date': damage_date,
                 'reported_by': self.env.user.id,
                 'estimated_cost': line.repair_cost or 0.0,
                 'responsible_type': 'student',
                 'responsible_student_name': self.student_name,
             }
-
-            damage_case = self.env['asset.damage.case'].create(vals)
-
             # Copy photos
             if line.checkin_photo_ids:
-                damage_case.write({'photo_ids': [(6, 0, line.checkin_photo_ids.ids)]})
+                vals['photo_ids'] = [(6, 0, line.checkin_photo_ids.ids)]
+            vals_list.append(vals)
+
+        damage_cases = self.env['asset.damage.case'].create(vals_list)
 
+        if len(damage_cases) == 1:
             return {
                 'type': 'ir.actions.act_window',
                 'res_model': 'asset.damage.case',
-                'res_id': damage_case.id,
+                'res_id': damage_cases.id,
                 'view_mode': 'form',
                 'target': 'current',
             }
 
-        # Multiple damaged assets - show message
-        else:
-            raise UserError(_(
-                'Multiple damaged assets found. Please create damage cases individually from the Asset Lines tab.'
-            ))
+        return {
+            'name': _('Damage Cases'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'asset.damage.case',
+            'view_mode': 'list,form',
+            'domain': [('id', 'in', damage_cases.ids)],
+            'target': 'current',
+        }
 
     # ========== Helper Methods (Token Validation & Signature Saving) ==========
 
@@ -981,217 +1018,115 @@ class AssetStudentAssignment(models.Model):
         """
         self.ensure_one()
 
-        if token_type == 'checkout':
-            stored_token = self.checkout_token
-            token_used = self.checkout_token_used
-            token_expiry = self.checkout_token_expiry
-        else:  # damage
-            stored_token = self.damage_report_token
-            token_used = self.damage_report_token_used
-            token_expiry = self.damage_report_token_expiry
-
-        # Check if token exists and matches (constant-time comparison)
-        if not stored_token or not secrets.compare_digest(stored_token, token):
-            _logger.warning(f'Token mismatch for {token_type} on record {self.id}')
+        if not token:
+            return 'invalid'
+
+        # Verify HMAC signature integrity first: forged or altered tokens are
+        # rejected before any stored token state is consulted
+        is_valid_hmac, hmac_error = self._verify_hmac_token(token, token_type)
+        if not is_valid_hmac:
+            _logger.warning('HMAC verification failed: %s for %s on record %s', hmac_error, token_type, self.id)
+            # Log security event (at most once per record/type/minute per worker)
+            throttle_key = (self.env.cr.dbname, self._name, self.id, token_type, hmac_error)
+            if should_log_security_event(throttle_key):
+                self.env['asset.security.audit.log'].sudo().log_security_event(
+                    event_type=f'token_{hmac_error}',
+                    ip_address='Unknown',
+                    error_message=f'Token {hmac_error} for {token_type} signature on record {self.id}',
+                    related_model=self._name,
+                    related_id=self.id,
+                    additional_info={'token_type': token_type}
+                )
+            return hmac_error
+
+        # Read the token trio in one cache population
+        token_field, used_field, expiry_field = TOKEN_FIELDS.get(token_type, TOKEN_FIELDS['damage'])
+        values = self.read([token_field, used_field, expiry_field])[0]
+        stored_token = values[token_field]
+        token_used = values[used_field]
+        token_expiry = values[expiry_field]
+
+        # Check the token is the one currently issued (constant-time, length-independent)
+        if not stored_token or not tokens_match(stored_token, token):
+            _logger.warning('Token mismatch for %s on record %s', token_type, self.id)
             return 'invalid'
 
         # Check if already used
         if token_used:
-            _logger.warning(f'Token already used for {token_type} on record {self.id}')
+            _logger.warning('Token already used for %s on record %s', token_type, self.id)
             return 'used'
 
         # Check expiration
         if token_expiry and token_expiry < fields.Datetime.now():
-            _logger.warning(f'Token expired for {token_type} on record {self.id}')
+            _logger.warning('Token expired for %s on record %s', token_type, self.id)
             return 'expired'
 
-        # Verify HMAC signature integrity
-        is_valid_hmac, hmac_error = self._verify_hmac_token(token, token_type)
-        if not is_valid_hmac:
-            _logger.warning(f'HMAC verification failed: {hmac_error} for {token_type} on record {self.id}')
-            # Log security event
-            self.env['asset.security.audit.log'].sudo().log_security_event(
-                event_type=f'token_{hmac_error}',
-                ip_address='Unknown',
-                error_message=f'Token {hmac_error} for {token_type} signature on record {self.id}',
-                related_model=self._name,
-                related_id=self.id,
-                additional_info={'token_type': token_type}
-            )
-            return hmac_error
-
         return 'valid'
 
     def _save_checkout_signature(self, signature_data, parent_name, ip_address):
-        """Save checkout signature and generate PDF"""
+        """Save checkout signature and queue PDF generation"""
         self.ensure_one()
-        import logging
-        _logger = logging.getLogger(__name__)
+        _logger.info("Saving checkout signature for %s - data length: %s",
+                     self.name, len(signature_data) if signature_data else 0)
 
-        _logger.info(f"Saving signature - data length: {len(signature_data) if signature_data else 0}")
-        _logger.info(f"Signature data preview: {signature_data[:50] if signature_data else 'None'}...")
+        now = fields.Datetime.now()
 
-        try:
-            # Save signature and mark token as used in ONE operation to avoid race conditions
+        # A savepoint undoes the signature if anything below fails
+        with self.env.cr.savepoint():
+            self._claim_token('checkout')
+
+            # Save signature and queue PDF generation in ONE operation
             self.write({
                 'checkout_student_signature': signature_data,
                 'parent_name': parent_name,
-                'checkout_sign_date': fields.Datetime.now(),
+                'checkout_sign_date': now,
                 'checkout_ip_address': ip_address,
-                'checkout_token_used': True,
+                'checkout_pdf_pending': True,
             })
 
-            # Flush to database to ensure data is committed before PDF generation
-            self.flush_recordset()
-
-            # Verify it was saved
-            _logger.info(f"After save - signature field length: {len(self.checkout_student_signature) if self.checkout_student_signature else 0}")
-            _logger.info(f"After save - signature exists: {bool(self.checkout_student_signature)}")
-
-            # Generate PDF
-            pdf_content = self._generate_checkout_waiver_pdf()
-
-            # Send confirmation email
-            template = self.env.ref(
-                'school_asset_management.email_template_student_checkout_confirmation',
-                raise_if_not_found=False
-            )
-            if template:
-                mail_id = template.send_mail(
-                    self.id,
-                    force_send=False,
-                    email_values={'email_to': self.parent_email}
-                )
-                if mail_id:
-                    mail = self.env['mail.mail'].sudo().browse(mail_id)
-                    if mail.exists():
-                        mail.send()
+            # PDF generation and confirmation email run in the background
+            self._trigger_signed_pdf_generation()
 
             # Log in chatter
             self.message_post(
                 body=_('✅ Parent signature received from %s on %s (IP: %s)') % (
                     parent_name,
-                    self.checkout_sign_date.strftime('%Y-%m-%d %H:%M:%S'),
+                    now.strftime('%Y-%m-%d %H:%M:%S'),
                     ip_address
                 )
             )
-        except Exception as e:
-            # Rollback signature if PDF generation fails
-            self.write({
-                'checkout_student_signature': False,
-                'checkout_sign_date': False,
-                'checkout_ip_address': False,
-            })
-            raise
 
     def _save_damage_signature(self, signature_data, ip_address):
-        """Save damage signature and generate PDF"""
+        """Save damage signature and queue PDF generation"""
         self.ensure_one()
 
-        # Save signature - Binary field expects base64 string
-        self.write({
-            'damage_signature': signature_data,
-            'damage_acknowledged': True,
-            'damage_acknowledge_date': fields.Datetime.now(),
-            'damage_acknowledge_ip': ip_address,
-        })
+        now = fields.Datetime.now()
 
-        # Flush to database to ensure data is committed before PDF generation
-        self.flush_recordset()
+        # A savepoint undoes the signature if anything below fails
+        with self.env.cr.savepoint():
+            self._claim_token('damage')
 
-        try:
-            # Generate PDF
-            pdf_content = self._generate_damage_report_pdf()
-
-            # Send confirmation email
-            template = self.env.ref(
-                'school_asset_management.email_template_student_damage_acknowledgment',
-                raise_if_not_found=False
-            )
-            if template:
-                mail_id = template.send_mail(
-                    self.id,
-                    force_send=False,
-                    email_values={'email_to': self.parent_email}
-                )
-                if mail_id:
-                    mail = self.env['mail.mail'].sudo().browse(mail_id)
-                    if mail.exists():
-                        mail.send()
+            # Save signature and queue PDF generation and confirmation email
+            # in ONE operation - Binary field expects base64 string
+            self.write({
+                'damage_signature': signature_data,
+                'damage_acknowledged': True,
+                'damage_acknowledge_date': now,
+                'damage_acknowledge_ip': ip_address,
+                'damage_pdf_pending': True,
+            })
 
-            # Mark token as used only after successful PDF generation
-            self.write({'damage_report_token_used': True})
+            self._trigger_signed_pdf_generation()
 
             # Log in chatter
             self.message_post(
                 body=_('⚠️ Damage acknowledged by %s on %s (IP: %s). Total cost: $%.2f') % (
                     self.parent_name,
-                    self.damage_acknowledge_date.strftime('%Y-%m-%d %H:%M:%S'),
+                    now.strftime('%Y-%m-%d %H:%M:%S'),
                     ip_address,
                     self.total_damage_cost
                 )
             )
-        except Exception as e:
-            # Rollback signature if PDF generation fails
-            self.write({
-                'damage_signature': False,
-                'damage_acknowledged': False,
-                'damage_acknowledge_date': False,
-                'damage_acknowledge_ip': False,
-            })
-            raise
-
-    def _generate_checkout_waiver_pdf(self):
-        """Generate signed checkout waiver PDF and attach to record"""
-        self.ensure_one()
-
-        # Delete old PDF attachment if exists
-        if self.checkout_signed_pdf_id:
-            self.checkout_signed_pdf_id.sudo().unlink()
-
-        # Generate PDF using report
-        report_action = self.env.ref('school_asset_management.action_report_student_checkout_waiver')
-        pdf_content, _ = report_action.sudo()._render_qweb_pdf('school_asset_management.report_signed_checkout_waiver', res_ids=self.ids)
-
-        # Create attachment
-        attachment = self.env['ir.attachment'].sudo().create({
-            'name': f'Checkout_Waiver_{self.name}.pdf',
-            'type': 'binary',
-            'datas': base64.b64encode(pdf_content),
-            'res_model': self._name,
-            'res_id': self.id,
-            'mimetype': 'application/pdf',
-        })
-
-        self.write({'checkout_signed_pdf_id': attachment.id})
-
-        return pdf_content
-
-    def _generate_damage_report_pdf(self):
-        """Generate signed damage report PDF and attach to record"""
-        self.ensure_one()
-
-        # Delete old PDF attachment if exists
-        if self.damage_signed_pdf_id:
-            self.damage_signed_pdf_id.sudo().unlink()
-
-        # Generate PDF using report
-        report_action = self.env.ref('school_asset_management.action_report_student_damage_report')
-        pdf_content, _ = report_action.sudo()._render_qweb_pdf('school_asset_management.report_signed_damage_report', res_ids=self.ids)
-
-        # Create attachment
-        attachment = self.env['ir.attachment'].sudo().create({
-            'name': f'Damage_Report_{self.name}.pdf',
-            'type': 'binary',
-            'datas': base64.b64encode(pdf_content),
-            'res_model': self._name,
-            'res_id': self.id,
-            'mimetype': 'application/pdf',
-        })
-
-        self.write({'damage_signed_pdf_id': attachment.id})
-
-        return pdf_content
 
 
 class AssetStudentLine(models.Model):
@@ -1211,7 +1146,6 @@ class AssetStudentLine(models.Model):
         'asset.asset',
         string='Asset',
         required=True,
-        domain=[('status', '=', 'available')],
         index=True
     )
 
@@ -1262,13 +1196,20 @@ class AssetStudentLine(models.Model):
     asset_name = fields.Char(related='asset_id.name', string='Asset Name', readonly=True)
     asset_category = fields.Char(related='asset_id.category_id.name', string='Category', readonly=True)
 
+    @api.onchange('asset_id')
+    def _onchange_asset_id(self):
+        """Only allow available assets (the selection domain lives in the views)"""
+        if self.asset_id and self.asset_id.status != 'available' and self.asset_id != self._origin.asset_id:
+            raise ValidationError(_(
+                'Asset "%s" is not available for assignment.'
+            ) % self.asset_id.display_name)
+
     @api.onchange('checkin_condition', 'checkout_condition')
     def _onchange_condition(self):
         """Auto-flag damage if condition worsened"""
         if self.checkin_condition and self.checkout_condition:
-            condition_order = {'excellent': 4, 'good': 3, 'fair': 2, 'poor': 1}
-            checkout_val = condition_order.get(self.checkout_condition, 0)
-            checkin_val = condition_order.get(self.checkin_condition, 0)
+            checkout_val = _CONDITION_ORDER.get(self.checkout_condition, 0)
+            checkin_val = _CONDITION_ORDER.get(self.checkin_condition, 0)
 
             if checkin_val < checkout_val:
                 self.damage_found = True
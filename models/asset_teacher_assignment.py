@@ -1,25 +1,58 @@
 # -*- coding: utf-8 -*-
 
-import base64
-import secrets
 import logging
-import hmac
-import hashlib
+from collections import defaultdict
 from datetime import timedelta
 from typing import Tuple
 from odoo import models, fields, api, _
+from odoo.tools import sql
 from odoo.exceptions import ValidationError, UserError
 
+from . import signature_watermark
+from .security_helpers import (
+    FALLBACK_SIGNATURE_SECRET,
+    TOKEN_EXPIRY_PARAMS,
+    TOKEN_FIELDS,
+    generate_hmac_token,
+    should_log_security_event,
+    tokens_match,
+    verify_hmac_token,
+)
+
 _logger = logging.getLogger(__name__)
 
+# Condition ranking used to detect worsened condition at check-in
+_CONDITION_ORDER = {'excellent': 4, 'good': 3, 'fair': 2, 'poor': 1, 'broken': 0}
+
 
 class AssetTeacherAssignment(models.Model):
     """Teacher Asset Assignment Model"""
     _name = 'asset.teacher.assignment'
     _description = 'Teacher Asset Assignment'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'asset.assignment.mixin']
     _order = 'checkout_date desc'
 
+    # Signed documents generated by the signed PDF cron (asset.assignment.mixin)
+    _signed_pdf_cron = 'school_asset_management.ir_cron_generate_teacher_signed_pdfs'
+    _signed_documents = {
+        'checkout': {
+            'pdf_field': 'checkout_signed_pdf_id',
+            'report': 'school_asset_management.action_report_teacher_checkout_waiver',
+            'report_template': 'school_asset_management.report_teacher_checkout_waiver',
+            'filename_prefix': 'Teacher_Checkout_Waiver',
+            'mail_template': 'school_asset_management.email_template_teacher_checkout_confirmation',
+        },
+        'damage': {
+            'pdf_field': 'damage_signed_pdf_id',
+            'report': 'school_asset_management.action_report_teacher_damage_acknowledgment',
+            'report_template': 'school_asset_management.report_teacher_damage_acknowledgment',
+            'filename_prefix': 'Teacher_Damage_Report',
+            'mail_template': 'school_asset_management.email_template_teacher_damage_acknowledgment',
+        },
+    }
+    # The confirmation templates address each mail to object.teacher_email
+    _signed_mail_fields = ['name', 'teacher_id', 'teacher_email']
+
     name = fields.Char(
         string='Reference',
         compute='_compute_name',
@@ -76,12 +109,13 @@ class AssetTeacherAssignment(models.Model):
     ], string='Status', default='draft', required=True, tracking=True,
         help='Assignment status')
 
-    state = fields.Selection([
-        ('draft', 'Draft'),
-        ('checked_out', 'Checked Out'),
-        ('inspected', 'Inspected'),
-        ('checked_in', 'Checked In'),
-    ], string='State', default='draft', tracking=True)
+    # Kept for backward compatibility (search domains); mirrors status so
+    # state changes are written and tracked only once
+    state = fields.Selection(
+        related='status',
+        store=True,
+        string='State'
+    )
 
     # Asset Lines
     asset_line_ids = fields.One2many(
@@ -94,7 +128,7 @@ class AssetTeacherAssignment(models.Model):
     # Signatures
     checkout_teacher_signature = fields.Binary(
         string='Teacher Signature (Checkout)',
-        attachment=False,  # Store in database, not as attachment
+        attachment=True,  # Filestore; only loaded when the field is read
         help='Teacher signature confirming asset receipt (ORIGINAL - DO NOT DISPLAY)'
     )
     checkout_teacher_signature_watermarked = fields.Binary(
@@ -118,7 +152,7 @@ class AssetTeacherAssignment(models.Model):
         string='Checkout Token',
         readonly=True,
         copy=False,
-        index=True,
+        index='btree_not_null',
         help='Unique token for checkout signature link'
     )
     checkout_token_expiry = fields.Datetime(
@@ -168,7 +202,7 @@ class AssetTeacherAssignment(models.Model):
         string='Damage Token',
         readonly=True,
         copy=False,
-        index=True,
+        index='btree_not_null',
         help='Unique token for damage report signature link'
     )
     damage_report_token_expiry = fields.Datetime(
@@ -195,7 +229,7 @@ class AssetTeacherAssignment(models.Model):
     )
     damage_signature = fields.Binary(
         string='Teacher Damage Signature',
-        attachment=False,  # Store in database, not as attachment
+        attachment=True,  # Filestore; only loaded when the field is read
         help='Teacher signature acknowledging damage and repair costs (ORIGINAL - DO NOT DISPLAY)'
     )
     damage_signature_watermarked = fields.Binary(
@@ -249,7 +283,7 @@ class AssetTeacherAssignment(models.Model):
         ('pending', 'Waiting for Signature'),
         ('signed', 'Signed'),
         ('expired', 'Link Expired'),
-    ], compute='_compute_checkout_signature_status', string='Signature Status', store=True)
+    ], compute='_compute_checkout_signature_status', string='Signature Status')
     teacher_email = fields.Char(
         related='teacher_id.work_email',
         string='Teacher Email',
@@ -270,59 +304,120 @@ class AssetTeacherAssignment(models.Model):
         help='Number of damage cases created'
     )
 
+    def init(self):
+        """Also migrate signatures stored inline by older versions"""
+        super().init()
+        self._migrate_signature_columns()
+
+    def _migrate_signature_columns(self):
+        """Move signatures stored inline by older versions to attachments.
+
+        The signature fields used to be ``attachment=False``; their old
+        columns are copied into ir.attachment once and then dropped.
+        """
+        for column in ('checkout_teacher_signature', 'damage_signature'):
+            if not sql.column_exists(self.env.cr, self._table, column):
+                continue
+            self.env.cr.execute(
+                f'SELECT id, "{column}" FROM "{self._table}" WHERE "{column}" IS NOT NULL'
+            )
+            rows = self.env.cr.fetchall()
+            if rows:
+                self.env['ir.attachment'].sudo().create([{
+                    'name': column,
+                    'res_model': self._name,
+                    'res_field': column,
+                    'res_id': record_id,
+                    'type': 'binary',
+                    'datas': bytes(value),
+                } for record_id, value in rows])
+            self.env.cr.execute(f'ALTER TABLE "{self._table}" DROP COLUMN "{column}"')
+            _logger.info("Moved %s %s values from %s to attachments", len(rows), column, self._table)
+
     @api.depends('teacher_id', 'checkout_date')
     def _compute_name(self):
         """Generate assignment name"""
+        # Load all teacher names in one query and translate the fallback once
+        self.teacher_id.fetch(['name'])
+        default_name = _('New Assignment')
         for record in self:
             if record.teacher_id and record.checkout_date:
                 record.name = f"{record.teacher_id.name} - {record.checkout_date}"
             else:
-                record.name = _('New Assignment')
+                record.name = default_name
 
     @api.depends('asset_line_ids.damage_found')
     def _compute_has_damage(self):
-        """Check if any asset has damage"""
+        """Check if any asset has damage (one grouped query for saved records)"""
+        damaged = dict(self.env['asset.assignment.line']._read_group(
+            [('assignment_id', 'in', self.filtered('id').ids)],
+            ['assignment_id'],
+            ['damage_found:bool_or'],
+        ))
         for record in self:
-            record.has_damage = any(line.damage_found for line in record.asset_line_ids)
+            if record.id:
+                record.has_damage = bool(damaged.get(record))
+            else:
+                record.has_damage = any(line.damage_found for line in record.asset_line_ids)
 
     @api.depends('asset_line_ids')
     def _compute_asset_count(self):
-        """Count assets in assignment"""
+        """Count assets in assignment (one grouped query for saved records)"""
+        counts = dict(self.env['asset.assignment.line']._read_group(
+            [('assignment_id', 'in', self.filtered('id').ids)],
+            ['assignment_id'],
+            ['__count'],
+        ))
         for record in self:
-            record.asset_count = len(record.asset_line_ids)
+            if record.id:
+                record.asset_count = counts.get(record, 0)
+            else:
+                record.asset_count = len(record.asset_line_ids)
 
     @api.depends('damage_case_ids')
     def _compute_damage_case_count(self):
-        """Count damage cases created from this assignment"""
+        """Count damage cases created from this assignment (one grouped query)"""
+        counts = dict(self.env['asset.damage.case']._read_group(
+            [('teacher_assignment_id', 'in', self.filtered('id').ids)],
+            ['teacher_assignment_id'],
+            ['__count'],
+        ))
         for record in self:
-            record.damage_case_count = len(record.damage_case_ids)
+            if record.id:
+                record.damage_case_count = counts.get(record, 0)
+            else:
+                record.damage_case_count = len(record.damage_case_ids)
 
     @api.depends('expected_return_date', 'status', 'return_type')
     def _compute_is_overdue(self):
         """Check if assignment is overdue"""
         today = fields.Date.today()
         for record in self:
+            is_overdue = False
+            days_overdue = 0
             # Only check overdue for specific_date type with checked_out status
-            if record.status == 'checked_out' and record.return_type == 'specific_date' and record.expected_return_date:
-                if record.expected_return_date < today:
-                    record.is_overdue = True
-                    record.days_overdue = (today - record.expected_return_date).days
-                else:
-                    record.is_overdue = False
-                    record.days_overdue = 0
-            else:
-                record.is_overdue = False
-                record.days_overdue = 0
+            # (draft, checked-in and cancelled assignments are never overdue)
+            if (record.status == 'checked_out' and record.return_type == 'specific_date'
+                    and record.expected_return_date and record.expected_return_date < today):
+                is_overdue = True
+                days_overdue = (today - record.expected_return_date).days
+
+            # Only write stored values that actually change
+            if record.is_overdue != is_overdue:
+                record.is_overdue = is_overdue
+            if record.days_overdue != days_overdue:
+                record.days_overdue = days_overdue
 
     @api.depends('checkout_token', 'checkout_token_expiry', 'checkout_token_used')
     def _compute_checkout_signature_status(self):
         """Compute checkout signature status"""
+        now = fields.Datetime.now()
         for record in self:
             if not record.checkout_token:
                 record.checkout_signature_status = 'not_sent'
             elif record.checkout_token_used:
                 record.checkout_signature_status = 'signed'
-            elif record.checkout_token_expiry and record.checkout_token_expiry < fields.Datetime.now():
+            elif record.checkout_token_expiry and record.checkout_token_expiry < now:
                 record.checkout_signature_status = 'expired'
             else:
                 record.checkout_signature_status = 'pending'
@@ -332,9 +427,13 @@ class AssetTeacherAssignment(models.Model):
         Generate watermarked versions of signatures for display
         SECURITY: Original signatures are protected, only watermarked versions shown to staff
         """
-        from . import signature_watermark
-
-        for record in self:
+        # Records without any signature (most rows of a list view) are reset in bulk
+        signed = self.filtered(lambda r: r.checkout_teacher_signature or r.damage_signature)
+        (self - signed).update({
+            'checkout_teacher_signature_watermarked': False,
+            'damage_signature_watermarked': False,
+        })
+        for record in signed:
             # Watermark checkout signature
             if record.checkout_teacher_signature:
                 record.checkout_teacher_signature_watermarked = signature_watermark.add_watermark_to_signature(
@@ -382,16 +481,14 @@ class AssetTeacherAssignment(models.Model):
         if not self.checkout_teacher_signature:
             raise UserError(_('Teacher signature is required for checkout.'))
 
-        # Update asset status
-        for line in self.asset_line_ids:
-            line.asset_id.write({
-                'status': 'assigned_teacher',
-                'custodian_id': self.teacher_id.id,
-            })
+        # Update asset status with a single write
+        self.asset_line_ids.asset_id.write({
+            'status': 'assigned_teacher',
+            'custodian_id': self.teacher_id.id,
+        })
 
         self.write({
             'status': 'checked_out',
-            'state': 'checked_out',
             'checkout_sign_date': fields.Datetime.now(),
         })
 
@@ -406,27 +503,34 @@ class AssetTeacherAssignment(models.Model):
         if not self.checkin_it_signature:
             raise UserError(_('IT staff signature is required for check-in.'))
 
+        # Load line conditions and assets for all lines in one query
+        lines = self.asset_line_ids
+        lines.fetch(['checkin_condition', 'asset_id'])
+
         # Check if all assets have check-in condition documented
-        for line in self.asset_line_ids:
+        for line in lines:
             if not line.checkin_condition:
                 raise UserError(_(
                     'Please document the check-in condition for all assets.'
                 ))
 
-        # Update asset status
-        for line in self.asset_line_ids:
-            line.asset_id.write({
+        # Update asset status with one write per check-in condition
+        assets_by_condition = defaultdict(lambda: self.env['asset.asset'])
+        for line in lines:
+            assets_by_condition[line.checkin_condition] |= line.asset_id
+        for condition, assets in assets_by_condition.items():
+            assets.write({
                 'status': 'available',
                 'custodian_id': False,
-                'condition_rating': line.checkin_condition,
+                'condition_rating': condition,
             })
 
+        now = fields.Datetime.now()
         self.write({
             'status': 'checked_in',
-            'state': 'checked_in',
-            'actual_return_date': fields.Date.today(),
+            'actual_return_date': now.date(),
             'checkin_it_user_id': self.env.user.id,
-            'checkin_sign_date': fields.Datetime.now(),
+            'checkin_sign_date': now,
         })
 
         # Send email notification
@@ -473,6 +577,9 @@ class AssetTeacherAssignment(models.Model):
         if not damaged_lines:
             raise UserError(_('No damaged assets found in this check-in.'))
 
+        # Load the fields used below, including photo ids, in one query
+        damaged_lines.fetch(['asset_id', 'damage_description', 'repair_cost', 'checkin_photo_ids'])
+
         # If only one damaged asset, create case directly
         if len(damaged_lines) == 1:
             line = damaged_lines[0]
@@ -516,7 +623,8 @@ class AssetTeacherAssignment(models.Model):
             raise_if_not_found=False
         )
         if template:
-            template.send_mail(self.id, force_send=True)
+            # Queued; the mail scheduler cron delivers it outside the request
+            template.send_mail(self.id, force_send=False)
 
     def _send_checkin_email(self):
         """Send check-in confirmation email"""
@@ -525,7 +633,8 @@ class AssetTeacherAssignment(models.Model):
             raise_if_not_found=False
         )
         if template:
-            template.send_mail(self.id, force_send=True)
+            # Queued; the mail scheduler cron delivers it outside the request
+            template.send_mail(self.id, force_send=False)
 
     # ========== Teacher Signature Methods ==========
 
@@ -542,48 +651,31 @@ class AssetTeacherAssignment(models.Model):
             - Uses HMAC-SHA256 for tamper-proof tokens
             - Secret key stored in ir.config_parameter
             - Includes record ID, timestamp, and random salt
+            - Compact struct-packed payload with raw digest, base64url encoded
         """
         self.ensure_one()
 
         # Get secret key from config (auto-generated on install)
-        secret_key = self.env['ir.config_parameter'].sudo().get_param(
+        secret_key = self._get_signature_config(
             'school_asset.signature_secret',
-            default='fallback_secret_DO_NOT_USE_IN_PRODUCTION'
+            FALLBACK_SIGNATURE_SECRET
         )
 
-        if secret_key == 'fallback_secret_DO_NOT_USE_IN_PRODUCTION':
+        if secret_key == FALLBACK_SIGNATURE_SECRET:
             _logger.warning('Using fallback secret key! Generate a proper one in System Parameters.')
 
         # Get expiry days from config
-        expiry_param_map = {
-            'checkout': 'school_asset.checkout_token_expiry_days',
-            'damage': 'school_asset.damage_token_expiry_days',
-            'approval': 'school_asset.approval_token_expiry_days',
-        }
-        expiry_days = int(self.env['ir.config_parameter'].sudo().get_param(
-            expiry_param_map.get(token_type, 'school_asset.checkout_token_expiry_days'),
-            default='7'
+        expiry_days = int(self._get_signature_config(
+            TOKEN_EXPIRY_PARAMS.get(token_type, TOKEN_EXPIRY_PARAMS['checkout']),
+            '7'
         ))
 
-        # Generate timestamp and salt
-        timestamp = str(int(fields.Datetime.now().timestamp()))
-        salt = secrets.token_hex(16)
-
-        # Create message: record_id|timestamp|salt|token_type
-        message = f"{self.id}|{timestamp}|{salt}|{token_type}"
-
-        # Generate HMAC-SHA256 signature
-        signature = hmac.new(
-            secret_key.encode('utf-8'),
-            message.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
-
-        # Token format: message.signature (URL-safe)
-        token = f"{message}.{signature}"
+        # Token payload: record_id, timestamp, random salt, token type (binary + base64url)
+        now = fields.Datetime.now()
+        token = generate_hmac_token(secret_key, self.id, token_type, int(now.timestamp()))
 
         # Calculate expiry
-        expiry = fields.Datetime.now() + timedelta(days=expiry_days)
+        expiry = now + timedelta(days=expiry_days)
 
         return token, expiry
 
@@ -601,53 +693,11 @@ class AssetTeacherAssignment(models.Model):
         """
         self.ensure_one()
 
-        try:
-            # Split token into message and signature
-            if '.' not in token:
-                return False, 'invalid'
-
-            message, received_signature = token.rsplit('.', 1)
-
-            # Parse message: record_id|timestamp|salt|token_type
-            parts = message.split('|')
-            if len(parts) != 4:
-                return False, 'invalid'
-
-            record_id, timestamp, salt, msg_token_type = parts
-
-            # Verify record ID matches
-            if int(record_id) != self.id:
-                _logger.warning(f'Token record ID mismatch: expected {self.id}, got {record_id}')
-                return False, 'invalid'
-
-            # Verify token type matches
-            if msg_token_type != token_type:
-                _logger.warning(f'Token type mismatch: expected {token_type}, got {msg_token_type}')
-                return False, 'invalid'
-
-            # Get secret key
-            secret_key = self.env['ir.config_parameter'].sudo().get_param(
-                'school_asset.signature_secret',
-                default='fallback_secret_DO_NOT_USE_IN_PRODUCTION'
-            )
-
-            # Calculate expected signature
-            expected_signature = hmac.new(
-                secret_key.encode('utf-8'),
-                message.encode('utf-8'),
-                hashlib.sha256
-            ).hexdigest()
-
-            # Constant-time comparison to prevent timing attacks
-            if not secrets.compare_digest(received_signature, expected_signature):
-                _logger.warning(f'HMAC signature verification failed for record {self.id}')
-                return False, 'tampered'
-
-            return True, 'valid'
-
-        except Exception as e:
-            _logger.error(f'Error verifying HMAC token: {e}')
-            return False, 'invalid'
+        secret_key = self._get_signature_config(
+            'school_asset.signature_secret',
+            FALLBACK_SIGNATURE_SECRET
+        )
+        return verify_hmac_token(secret_key, token, self.id, token_type)
 
     def action_send_checkout_signature_request(self):
         """Generate HMAC token and send checkout signature request email to teacher"""
@@ -670,15 +720,12 @@ class AssetTeacherAssignment(models.Model):
             raise_if_not_found=False
         )
         if template:
-            mail_id = template.send_mail(
+            # force_send sends the mail inline, no need to re-browse mail.mail
+            template.send_mail(
                 self.id,
-                force_send=False,
+                force_send=True,
                 email_values={'email_to': self.teacher_email}
             )
-            if mail_id:
-                mail = self.env['mail.mail'].sudo().browse(mail_id)
-                if mail.exists():
-                    mail.send()
 
             self.message_post(
                 body=_('Checkout signature request sent to %s') % self.teacher_email
@@ -725,15 +772,12 @@ class AssetTeacherAssignment(models.Model):
             raise_if_not_found=False
         )
         if template:
-            mail_id = template.send_mail(
+            # Queued; the mail scheduler delivers it without blocking the request
+            template.send_mail(
                 self.id,
                 force_send=False,
                 email_values={'email_to': self.teacher_email}
             )
-            if mail_id:
-                mail = self.env['mail.mail'].sudo().browse(mail_id)
-                if mail.exists():
-                    mail.send()
 
             self.message_post(
                 body=_('⚠️ Damage report sent to %s') % self.teacher_email
@@ -786,8 +830,7 @@ class AssetTeacherAssignment(models.Model):
         if not self.checkout_token:
             raise UserError(_('Please send signature request first to generate link.'))
 
-        # Get base URL
-        base_url = self.env['ir.config_parameter'].sudo().get_param('web.base.url')
+        base_url = self.get_base_url()
         link = f"{base_url}/sign/teacher/checkout/{self.checkout_token}"
         expiry = self.checkout_token_expiry.strftime('%Y-%m-%d %H:%M') if self.checkout_token_expiry else 'N/A'
 
@@ -807,8 +850,7 @@ class AssetTeacherAssignment(models.Model):
         if not self.damage_report_token:
             raise UserError(_('Please send damage report first to generate link.'))
 
-        # Get base URL
-        base_url = self.env['ir.config_parameter'].sudo().get_param('web.base.url')
+        base_url = self.get_base_url()
         link = f"{base_url}/sign/teacher/damage/{self.damage_report_token}"
         expiry = self.damage_report_token_expiry.strftime('%Y-%m-%d %H:%M') if self.damage_report_token_expiry else 'N/A'
 
@@ -842,206 +884,112 @@ class AssetTeacherAssignment(models.Model):
         """
         self.ensure_one()
 
-        if token_type == 'checkout':
-            stored_token = self.checkout_token
-            token_used = self.checkout_token_used
-            token_expiry = self.checkout_token_expiry
-        else:  # damage
-            stored_token = self.damage_report_token
-            token_used = self.damage_report_token_used
-            token_expiry = self.damage_report_token_expiry
-
-        # Check if token exists and matches (constant-time comparison)
-        if not stored_token or not secrets.compare_digest(stored_token, token):
-            _logger.warning(f'Token mismatch for {token_type} on record {self.id}')
+        if not token:
+            return 'invalid'
+
+        # Verify HMAC signature integrity first: forged or altered tokens are
+        # rejected before any stored token state is consulted
+        is_valid_hmac, hmac_error = self._verify_hmac_token(token, token_type)
+        if not is_valid_hmac:
+            _logger.warning('HMAC verification failed: %s for %s on record %s', hmac_error, token_type, self.id)
+            # Log security event (at most once per record/type/minute per worker)
+            throttle_key = (self.env.cr.dbname, self._name, self.id, token_type, hmac_error)
+            if should_log_security_event(throttle_key):
+                self.env['asset.security.audit.log'].sudo().log_security_event(
+                    event_type=f'token_{hmac_error}',
+                    ip_address='Unknown',
+                    error_message=f'Token {hmac_error} for {token_type} signature on record {self.id}',
+                    related_model=self._name,
+                    related_id=self.id,
+                    additional_info={'token_type': token_type}
+                )
+            return hmac_error
+
+        # Read the token trio in one cache population
+        token_field, used_field, expiry_field = TOKEN_FIELDS.get(token_type, TOKEN_FIELDS['damage'])
+        values = self.read([token_field, used_field, expiry_field])[0]
+        stored_token = values[token_field]
+        token_used = values[used_field]
+        token_expiry = values[expiry_field]
+
+        # Check the token is the one currently issued (constant-time, length-independent)
+        if not stored_token or not tokens_match(stored_token, token):
+            _logger.warning('Token mismatch for %s on record %s', token_type, self.id)
             return 'invalid'
 
         # Check if already used
         if token_used:
-            _logger.warning(f'Token already used for {token_type} on record {self.id}')
+            _logger.warning('Token already used for %s on record %s', token_type, self.id)
             return 'used'
 
         # Check expiration
         if token_expiry and token_expiry < fields.Datetime.now():
-            _logger.warning(f'Token expired for {token_type} on record {self.id}')
+            _logger.warning('Token expired for %s on record %s', token_type, self.id)
             return 'expired'
 
-        # Verify HMAC signature integrity
-        is_valid_hmac, hmac_error = self._verify_hmac_token(token, token_type)
-        if not is_valid_hmac:
-            _logger.warning(f'HMAC verification failed: {hmac_error} for {token_type} on record {self.id}')
-            # Log security event
-            self.env['asset.security.audit.log'].sudo().log_security_event(
-                event_type=f'token_{hmac_error}',
-                ip_address='Unknown',
-                error_message=f'Token {hmac_error} for {token_type} signature on record {self.id}',
-                related_model=self._name,
-                related_id=self.id,
-                additional_info={'token_type': token_type}
-            )
-            return hmac_error
-
         return 'valid'
 
     def _save_checkout_signature(self, signature_data, ip_address):
-        """Save checkout signature and generate PDF"""
+        """Save checkout signature and queue PDF generation"""
         self.ensure_one()
 
-        try:
-            # Save signature and mark token as used in ONE operation to avoid race conditions
+        now = fields.Datetime.now()
+
+        # A savepoint undoes the signature if anything below fails
+        with self.env.cr.savepoint():
+            self._claim_token('checkout')
+
+            # Save signature and queue PDF generation and confirmation email
+            # in ONE operation
             self.write({
                 'checkout_teacher_signature': signature_data,
-                'checkout_sign_date': fields.Datetime.now(),
+                'checkout_sign_date': now,
                 'checkout_ip_address': ip_address,
-                'checkout_token_used': True,
+                'checkout_pdf_pending': True,
             })
 
-            # Flush to database to ensure data is committed before PDF generation
-            self.flush_recordset()
-
-            # Generate PDF
-            pdf_content = self._generate_checkout_waiver_pdf()
-
-            # Send confirmation email
-            template = self.env.ref(
-                'school_asset_management.email_template_teacher_checkout_confirmation',
-                raise_if_not_found=False
-            )
-            if template:
-                mail_id = template.send_mail(
-                    self.id,
-                    force_send=False,
-                    email_values={'email_to': self.teacher_email}
-                )
-                if mail_id:
-                    mail = self.env['mail.mail'].sudo().browse(mail_id)
-                    if mail.exists():
-                        mail.send()
+            # PDF generation and confirmation email run in the background
+            self._trigger_signed_pdf_generation()
 
             # Log in chatter
             self.message_post(
                 body=_('✅ Teacher signature received from %s on %s (IP: %s)') % (
                     self.teacher_id.name,
-                    self.checkout_sign_date.strftime('%Y-%m-%d %H:%M:%S'),
+                    now.strftime('%Y-%m-%d %H:%M:%S'),
                     ip_address
                 )
             )
-        except Exception as e:
-            # Rollback signature if PDF generation fails
-            self.write({
-                'checkout_teacher_signature': False,
-                'checkout_sign_date': False,
-                'checkout_ip_address': False,
-            })
-            raise
 
     def _save_damage_signature(self, signature_data, ip_address):
-        """Save damage signature and generate PDF"""
+        """Save damage signature and queue PDF generation"""
         self.ensure_one()
 
-        # Save signature - Binary field expects base64 string
-        self.write({
-            'damage_signature': signature_data,
-            'damage_acknowledged': True,
-            'damage_acknowledge_date': fields.Datetime.now(),
-            'damage_acknowledge_ip': ip_address,
-        })
-
-        # Flush to database to ensure data is committed before PDF generation
-        self.flush_recordset()
+        now = fields.Datetime.now()
 
-        try:
-            # Generate PDF
-            pdf_content = self._generate_damage_report_pdf()
+        # A savepoint undoes the signature if anything below fails
+        with self.env.cr.savepoint():
+            self._claim_token('damage')
 
-            # Send confirmation email
-            template = self.env.ref(
-                'school_asset_management.email_template_teacher_damage_acknowledgment',
-                raise_if_not_found=False
-            )
-            if template:
-                mail_id = template.send_mail(
-                    self.id,
-                    force_send=False,
-                    email_values={'email_to': self.teacher_email}
-                )
-                if mail_id:
-                    mail = self.env['mail.mail'].sudo().browse(mail_id)
-                    if mail.exists():
-                        mail.send()
+            # Save signature and queue PDF generation and confirmation email
+            # in ONE operation - Binary field expects base64 string
+            self.write({
+                'damage_signature': signature_data,
+                'damage_acknowledged': True,
+                'damage_acknowledge_date': now,
+                'damage_acknowledge_ip': ip_address,
+                'damage_pdf_pending': True,
+            })
 
-            # Mark token as used only after successful PDF generation
-            self.write({'damage_report_token_used': True})
+            self._trigger_signed_pdf_generation()
 
             # Log in chatter
             self.message_post(
                 body=_('⚠️ Damage acknowledged by %s on %s (IP: %s)') % (
                     self.teacher_id.name,
-                    self.damage_acknowledge_date.strftime('%Y-%m-%d %H:%M:%S'),
+                    now.strftime('%Y-%m-%d %H:%M:%S'),
                     ip_address
                 )
             )
-        except Exception as e:
-            # Rollback signature if PDF generation fails
-            self.write({
-                'damage_signature': False,
-                'damage_acknowledged': False,
-                'damage_acknowledge_date': False,
-                'damage_acknowledge_ip': False,
-            })
-            raise
-
-    def _generate_checkout_waiver_pdf(self):
-        """Generate signed checkout waiver PDF and attach to record"""
-        self.ensure_one()
-
-        # Delete old PDF attachment if exists
-        if self.checkout_signed_pdf_id:
-            self.checkout_signed_pdf_id.sudo().unlink()
-
-        # Generate PDF using report
-        report_action = self.env.ref('school_asset_management.action_report_teacher_checkout_waiver')
-        pdf_content, _ = report_action.sudo()._render_qweb_pdf('school_asset_management.report_teacher_checkout_waiver', res_ids=self.ids)
-
-        # Create attachment
-        attachment = self.env['ir.attachment'].sudo().create({
-            'name': f'Teacher_Checkout_Waiver_{self.name}.pdf',
-            'type': 'binary',
-            'datas': base64.b64encode(pdf_content),
-            'res_model': self._name,
-            'res_id': self.id,
-            'mimetype': 'application/pdf',
-        })
-
-        self.write({'checkout_signed_pdf_id': attachment.id})
-
-        return pdf_content
-
-    def _generate_damage_report_pdf(self):
-        """Generate signed damage report PDF and attach to record"""
-        self.ensure_one()
-
-        # Delete old PDF attachment if exists
-        if self.damage_signed_pdf_id:
-            self.damage_signed_pdf_id.sudo().unlink()
-
-        # Generate PDF using report
-        report_action = self.env.ref('school_asset_management.action_report_teacher_damage_acknowledgment')
-        pdf_content, _ = report_action.sudo()._render_qweb_pdf('school_asset_management.report_teacher_damage_acknowledgment', res_ids=self.ids)
-
-        # Create attachment
-        attachment = self.env['ir.attachment'].sudo().create({
-            'name': f'Teacher_Damage_Report_{self.name}.pdf',
-            'type': 'binary',
-            'datas': base64.b64encode(pdf_content),
-            'res_model': self._name,
-            'res_id': self.id,
-            'mimetype': 'application/pdf',
-        })
-
-        self.write({'damage_signed_pdf_id': attachment.id})
-
-        return pdf_content
 
 
 class AssetAssignmentLine(models.Model):
@@ -1119,9 +1067,8 @@ class AssetAssignmentLine(models.Model):
     def _onchange_condition(self):
         """Auto-flag damage if condition worsened"""
         if self.checkin_condition and self.checkout_condition:
-            condition_order = {'excellent': 4, 'good': 3, 'fair': 2, 'poor': 1}
-            checkout_val = condition_order.get(self.checkout_condition, 0)
-            checkin_val = condition_order.get(self.checkin_condition, 0)
+            checkout_val = _CONDITION_ORDER.get(self.checkout_condition, 0)
+            checkin_val = _CONDITION_ORDER.get(self.checkin_condition, 0)
 
             if checkin_val < checkout_val:
                 self.damage_found = True
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api
+from collections import defaultdict
+
+from odoo import models, fields, api, tools
 
 
 class HrEmployeeAssetInfo(models.Model):
@@ -27,42 +29,54 @@ class HrEmployeeAssetInfo(models.Model):
         help='Number of assets currently assigned'
     )
 
-    @api.depends('name')
     def _compute_asset_assignment_count(self):
         """Compute active assignment count only (excluding returned and cancelled)"""
+        # Count only active assignments (draft or checked_out), in one grouped query
+        counts = dict(self.env['asset.teacher.assignment']._read_group(
+            [('teacher_id', 'in', self._origin.ids), ('state', 'in', ['draft', 'checked_out'])],
+            ['teacher_id'],
+            ['__count'],
+        ))
         for employee in self:
-            # Count only active assignments (draft or checked_out)
-            active_count = self.env['asset.teacher.assignment'].search_count([
-                ('teacher_id', '=', employee.id),
-                ('state', 'in', ['draft', 'checked_out'])
-            ])
-            employee.asset_assignment_count = active_count
+            employee.asset_assignment_count = counts.get(employee._origin, 0)
 
-    @api.depends('name')
     def _compute_current_assets(self):
         """Compute currently assigned assets"""
-        for employee in self:
-            active_assignments = self.env['asset.teacher.assignment'].search([
-                ('teacher_id', '=', employee.id),
-                ('state', 'in', ['draft', 'checked_out'])
-            ])
-
-            # Get all asset IDs from active assignment lines
-            asset_ids = []
-            for assignment in active_assignments:
-                for line in assignment.asset_line_ids:
-                    if line.asset_id:
-                        asset_ids.append(line.asset_id.id)
+        # Group the active assignment lines of every employee in one query;
+        # going through the ORM keeps the caller's record rules applied
+        asset_map = defaultdict(set)
+        for assignment, asset_ids in self.env['asset.assignment.line']._read_group(
+            [
+                ('assignment_id.teacher_id', 'in', self._origin.ids),
+                ('assignment_id.state', 'in', ['draft', 'checked_out']),
+                ('asset_id', '!=', False),
+            ],
+            ['assignment_id'],
+            ['asset_id:array_agg'],
+        ):
+            asset_map[assignment.teacher_id.id].update(asset_ids)
 
+        for employee in self:
+            asset_ids = sorted(asset_map.get(employee._origin.id, ()))
             employee.current_asset_ids = [(6, 0, asset_ids)]
             employee.current_asset_count = len(asset_ids)
 
+    @api.model
+    @tools.ormcache('self.env.uid', 'self.env.lang')
+    def _get_asset_assignments_action(self):
+        """Return the assignments window action, cached per user and language.
+
+        Writing any action clears the registry caches, so edits propagate.
+        """
+        return self.env['ir.actions.act_window']._for_xml_id(
+            'school_asset_management.action_asset_teacher_assignment'
+        )
+
     def action_view_asset_assignments(self):
         """Open asset assignments for this employee"""
         self.ensure_one()
-        action = self.env['ir.actions.act_window']._for_xml_id(
-            'school_asset_management.action_asset_teacher_assignment'
-        )
+        # Shallow copy: only top-level keys are replaced below
+        action = dict(self._get_asset_assignments_action())
         action.update({
             'name': f'Asset Assignments - {self.name}',
             'domain': [('teacher_id', '=', self.id)],
@@ -1,6 +1,15 @@
 # -*- coding: utf-8 -*-
 
+import heapq
+from collections import defaultdict
+from operator import itemgetter
+
 from odoo import models, fields, api
+from odoo.tools import sql
+
+
+# log_signature_attempt keyword arguments stored in their own columns
+_SIGNATURE_KWARG_FIELDS = ('student_name', 'parent_email', 'teacher_name', 'teacher_email', 'user_agent')
 
 
 class SecurityAuditLog(models.Model):
@@ -46,6 +55,23 @@ class SecurityAuditLog(models.Model):
     error_message = fields.Text(string='Error Message')
     additional_info = fields.Text(string='Additional Information')
 
+    def init(self):
+        """Index the date-bounded filters used by the stats and retention jobs"""
+        sql.create_index(
+            self.env.cr,
+            f'{self._table}_date_event_idx',
+            self._table,
+            ['create_date', 'event_type'],
+        )
+        # Suspicious-IP ranking only ever looks at failed attempts
+        sql.create_index(
+            self.env.cr,
+            f'{self._table}_date_failed_ip_idx',
+            self._table,
+            ['create_date', 'ip_address'],
+            where="event_type IN ('signature_failed', 'token_invalid')",
+        )
+
     @api.model_create_multi
     def create(self, vals_list):
         """Override create to generate sequence"""
@@ -68,24 +94,24 @@ class SecurityAuditLog(models.Model):
             related_model: Model name (e.g., 'asset.student.assignment')
             related_id: Record ID
             error_message: Error message if applicable
-            **kwargs: Additional info (student_name, parent_email, etc.)
+            **kwargs: student_name, parent_email, teacher_name, teacher_email
+                and user_agent go to their own columns; any other keyword is
+                stored in additional_info
+
+        The entry is buffered and written at commit, so nothing is returned.
         """
-        vals = {
-            'event_type': event_type,
-            'signature_type': signature_type,
-            'ip_address': ip_address,
-            'token_prefix': token[:8] if token else None,
-            'related_model': related_model,
-            'related_id': related_id,
-            'error_message': error_message,
-            'student_name': kwargs.get('student_name'),
-            'parent_email': kwargs.get('parent_email'),
-            'teacher_name': kwargs.get('teacher_name'),
-            'teacher_email': kwargs.get('teacher_email'),
-            'user_agent': kwargs.get('user_agent'),
-            'additional_info': str(kwargs) if kwargs else None,
-        }
-        return self.create(vals)
+        extra = {key: value for key, value in kwargs.items() if key not in _SIGNATURE_KWARG_FIELDS}
+        self._create_audit(
+            event_type=event_type,
+            signature_type=signature_type,
+            ip_address=ip_address,
+            token_prefix=token[:8] if token else None,
+            related_model=related_model,
+            related_id=related_id,
+            error_message=error_message,
+            additional_info=str(extra) if extra else None,
+            **{key: kwargs.get(key) for key in _SIGNATURE_KWARG_FIELDS},
+        )
 
     @api.model
     def log_security_event(self, event_type, ip_address, error_message=None,
@@ -100,13 +126,16 @@ class SecurityAuditLog(models.Model):
             related_model: Model name
             related_id: Record ID
             additional_info: Additional information (can be dict or string)
-            **kwargs: Additional fields
+            **kwargs: Additional fields (only user_agent is stored)
+
+        The entry is buffered and written at commit, so nothing is returned.
         """
         # Convert additional_info dict to string
         if isinstance(additional_info, dict):
             additional_info = str(additional_info)
 
-        vals = {
+        # Fire-and-forget events (failed tokens, rate limits) skip the ORM create pipeline
+        self._buffer_audit('fast', {
             'event_type': event_type,
             'ip_address': ip_address,
             'error_message': error_message,
@@ -114,8 +143,61 @@ class SecurityAuditLog(models.Model):
             'related_id': related_id,
             'additional_info': additional_info,
             'user_agent': kwargs.get('user_agent'),
-        }
-        return self.create(vals)
+        })
+
+    @api.model
+    def _create_audit(self, **vals):
+        """Queue one audit entry for the ORM create, leaving unset (None) columns to their defaults"""
+        self._buffer_audit('orm', vals)
+
+    @api.model
+    def _buffer_audit(self, kind, vals):
+        """Buffer an audit entry until the transaction commits.
+
+        All entries logged during a request are written together by
+        _flush_audit_buffer just before commit: one create() for the
+        'orm' entries and one multi-row INSERT for the 'fast' ones.
+        """
+        buffers = self.env.cr.precommit.data.setdefault(self._name, {})
+        if not buffers:
+            self.env.cr.precommit.add(self.sudo()._flush_audit_buffer)
+        buffers.setdefault(kind, []).append({key: value for key, value in vals.items() if value is not None})
+
+    def _flush_audit_buffer(self):
+        """Write the audit entries buffered on the current transaction"""
+        buffers = self.env.cr.precommit.data.pop(self._name, {})
+        if buffers.get('orm'):
+            self.create(buffers['orm'])
+        if buffers.get('fast'):
+            self._fast_log(buffers['fast'])
+
+    @api.model
+    def _fast_log(self, vals_list):
+        """Insert audit entries with a single INSERT, bypassing the ORM.
+
+        Meant for high-volume failure events; only plain stored columns
+        may be passed and the cache is not populated. Event IDs still take
+        one ir.sequence call per row, like create(), since the sequence
+        API has no way to reserve several numbers at once.
+        """
+        next_name = self.env['ir.sequence'].sudo().next_by_code
+        rows = [
+            dict(vals, name=next_name('asset.security.audit.log') or 'New')
+            for vals in vals_list
+        ]
+        columns = list(dict.fromkeys(self._fields[key].name for vals in rows for key in vals))
+        placeholders = ', '.join(['%s'] * (len(columns) + 2))
+        params = []
+        for vals in rows:
+            params.extend(vals.get(column) for column in columns)
+            params.extend([self.env.uid, self.env.uid])
+        self.env.cr.execute(
+            f"""INSERT INTO {self._table} ({', '.join(columns)}, create_uid, write_uid, create_date, write_date)
+                VALUES {', '.join(
+                    f"({placeholders}, now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC')" for _ in rows
+                )}""",
+            params,
+        )
 
     @api.model
     def get_security_stats(self, days=30):
@@ -132,18 +214,20 @@ class SecurityAuditLog(models.Model):
             ('create_date', '>=', fields.Datetime.now() - fields.timedelta(days=days))
         ]
 
-        total_attempts = self.search_count(domain)
-        failed_attempts = self.search_count(domain + [('event_type', 'in', ['signature_failed', 'token_invalid', 'token_expired'])])
-        rate_limited = self.search_count(domain + [('event_type', '=', 'rate_limit_exceeded')])
-
-        # Top suspicious IPs (most failed attempts)
-        failed_by_ip = {}
-        failed_records = self.search(domain + [('event_type', 'in', ['signature_failed', 'token_invalid'])])
-        for record in failed_records:
-            if record.ip_address:
-                failed_by_ip[record.ip_address] = failed_by_ip.get(record.ip_address, 0) + 1
+        # One grouped query; every counter is derived from it in a single pass
+        total_attempts = failed_attempts = rate_limited = 0
+        failed_by_ip = defaultdict(int)
+        for event_type, ip_address, count in self._read_group(domain, ['event_type', 'ip_address'], ['__count']):
+            total_attempts += count
+            if event_type in ('signature_failed', 'token_invalid', 'token_expired'):
+                failed_attempts += count
+            elif event_type == 'rate_limit_exceeded':
+                rate_limited += count
+            # Top suspicious IPs (most failed attempts)
+            if ip_address and event_type in ('signature_failed', 'token_invalid'):
+                failed_by_ip[ip_address] += count
 
-        suspicious_ips = sorted(failed_by_ip.items(), key=lambda x: x[1], reverse=True)[:10]
+        suspicious_ips = heapq.nlargest(10, failed_by_ip.items(), key=itemgetter(1))
 
         return {
             'total_attempts': total_attempts,
@@ -162,7 +246,12 @@ class SecurityAuditLog(models.Model):
             days: Retention period in days (default 730 = 2 years)
         """
         cutoff_date = fields.Datetime.now() - fields.timedelta(days=days)
-        old_logs = self.search([('create_date', '<', cutoff_date)])
-        count = len(old_logs)
-        old_logs.unlink()
+        # Audit rows have no dependents; delete the whole range in one statement
+        self.flush_model()
+        self.env.cr.execute(
+            f"DELETE FROM {self._table} WHERE create_date < %s",
+            (cutoff_date,),
+        )
+        count = self.env.cr.rowcount
+        self.invalidate_model()
         return count
@@ -1,9 +1,18 @@
 # -*- coding: utf-8 -*-
 
+import base64
+import hashlib
+import hmac
 import logging
+import re
 import secrets
-from typing import Optional, Tuple
-from datetime import datetime, timedelta
+import socket
+import struct
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 from odoo import models, api
 from odoo.exceptions import UserError
 
@@ -17,6 +26,291 @@ except ImportError:
     _logger.warning('Redis library not available. Rate limiting will use fallback mode.')
 
 
+@lru_cache(maxsize=8)
+def _get_hmac_base(secret_key: str):
+    """Return a keyed HMAC-SHA256 object for the given secret.
+
+    The key is absorbed into the inner/outer hash state only once per
+    secret; callers must copy() the object before updating it.
+    """
+    return hmac.new(secret_key.encode('utf-8'), digestmod=hashlib.sha256)
+
+
+# Signature token configuration shared by the assignment models
+FALLBACK_SIGNATURE_SECRET = 'fallback_secret_DO_NOT_USE_IN_PRODUCTION'
+TOKEN_EXPIRY_PARAMS = {
+    'checkout': 'school_asset.checkout_token_expiry_days',
+    'damage': 'school_asset.damage_token_expiry_days',
+    'approval': 'school_asset.approval_token_expiry_days',
+}
+# Stored token, used flag and expiry fields per token type
+TOKEN_FIELDS = {
+    'checkout': ('checkout_token', 'checkout_token_used', 'checkout_token_expiry'),
+    'damage': ('damage_report_token', 'damage_report_token_used', 'damage_report_token_expiry'),
+}
+
+
+class TokenAlreadyUsedError(UserError):
+    """Raised when a signature token was consumed by another submission"""
+
+# Compact token layout: record_id (u64), timestamp (u64), salt (16 bytes),
+# token type code (u8), followed by the raw 32-byte HMAC-SHA256 digest.
+TOKEN_TYPE_CODES = {
+    'checkout': 1,
+    'damage': 2,
+    'approval': 3,
+}
+_TOKEN_PAYLOAD = struct.Struct('<QQ16sB')
+_TOKEN_RAW_SIZE = _TOKEN_PAYLOAD.size + hashlib.sha256().digest_size
+# Legacy token message: record_id|timestamp|salt|token_type (hex or urlsafe salt)
+_LEGACY_TOKEN_RE = re.compile(r'(\d+)\|(\d+)\|([A-Za-z0-9_-]+)\|(checkout|damage|approval)')
+
+
+# Per-process key used to hash both sides of a stored-token comparison
+_TOKEN_COMPARE_KEY = secrets.token_bytes(32)
+
+
+def tokens_match(stored_token: str, received_token: str) -> bool:
+    """Compare a stored token with a received one in constant time.
+
+    Both values are HMAC'ed to fixed-length digests first, so the comparison
+    time does not reveal the length of the stored token.
+    """
+    return hmac.compare_digest(
+        hmac.new(_TOKEN_COMPARE_KEY, stored_token.encode(), hashlib.sha256).digest(),
+        hmac.new(_TOKEN_COMPARE_KEY, received_token.encode(), hashlib.sha256).digest(),
+    )
+
+
+def _hmac_digest(secret_key: str, data: bytes) -> bytes:
+    """Return the raw HMAC-SHA256 digest of data using the cached key state."""
+    mac = _get_hmac_base(secret_key).copy()
+    mac.update(data)
+    return mac.digest()
+
+
+def compute_hmac_signature(secret_key: str, message: str) -> str:
+    """Compute the hex HMAC-SHA256 signature of a legacy token message.
+
+    Args:
+        secret_key: HMAC secret key
+        message: Token message to sign
+
+    Returns:
+        str: Hex-encoded signature
+    """
+    mac = _get_hmac_base(secret_key).copy()
+    mac.update(message.encode('utf-8'))
+    return mac.hexdigest()
+
+
+def generate_hmac_token(secret_key: str, record_id: int, token_type: str, timestamp: int) -> str:
+    """Generate a compact HMAC-SHA256 signed token.
+
+    Token format: base64url(struct payload + raw digest), without padding.
+
+    Args:
+        secret_key: HMAC secret key
+        record_id: ID of the record the token belongs to
+        token_type: Token type ('checkout', 'damage', 'approval')
+        timestamp: Issue time as a Unix timestamp
+
+    Returns:
+        str: URL-safe token
+    """
+    payload = _TOKEN_PAYLOAD.pack(
+        record_id, timestamp, secrets.token_bytes(16), TOKEN_TYPE_CODES[token_type]
+    )
+    raw = payload + _hmac_digest(secret_key, payload)
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def verify_hmac_token(secret_key: str, token: str, record_id: int, token_type: str) -> Tuple[bool, str]:
+    """Verify HMAC-SHA256 token integrity for a record.
+
+    Accepts compact binary tokens as well as legacy
+    record_id|timestamp|salt|token_type.signature tokens issued before
+    the format change.
+
+    Args:
+        secret_key: HMAC secret key
+        token: Token string to verify
+        record_id: ID of the record the token must belong to
+        token_type: Expected token type
+
+    Returns:
+        Tuple[bool, str]: (is_valid, error_message)
+            - error_message: 'valid', 'invalid' or 'tampered'
+    """
+    try:
+        if '.' in token:
+            return _verify_legacy_hmac_token(secret_key, token, record_id, token_type)
+
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        if len(raw) != _TOKEN_RAW_SIZE:
+            return False, 'invalid'
+
+        payload, received_digest = raw[:_TOKEN_PAYLOAD.size], raw[_TOKEN_PAYLOAD.size:]
+        msg_record_id, timestamp, salt, type_code = _TOKEN_PAYLOAD.unpack(payload)
+
+        # Verify record ID matches
+        if msg_record_id != record_id:
+            _logger.warning(f'Token record ID mismatch: expected {record_id}, got {msg_record_id}')
+            return False, 'invalid'
+
+        # Verify token type matches
+        if type_code != TOKEN_TYPE_CODES.get(token_type):
+            _logger.warning(f'Token type mismatch: expected {token_type}, got code {type_code}')
+            return False, 'invalid'
+
+        # Constant-time comparison to prevent timing attacks
+        if not hmac.compare_digest(received_digest, _hmac_digest(secret_key, payload)):
+            _logger.warning(f'HMAC signature verification failed for record {record_id}')
+            return False, 'tampered'
+
+        return True, 'valid'
+
+    except Exception as e:
+        _logger.error(f'Error verifying HMAC token: {e}')
+        return False, 'invalid'
+
+
+def _verify_legacy_hmac_token(secret_key: str, token: str, record_id: int, token_type: str) -> Tuple[bool, str]:
+    """Verify a legacy pipe-delimited token (record_id|timestamp|salt|token_type.signature)."""
+    message, received_signature = token.rsplit('.', 1)
+
+    # Parse message: record_id|timestamp|salt|token_type
+    match = _LEGACY_TOKEN_RE.fullmatch(message)
+    if not match:
+        return False, 'invalid'
+
+    msg_record_id, timestamp, salt, msg_token_type = match.groups()
+
+    # Verify record ID matches
+    if int(msg_record_id) != record_id:
+        _logger.warning(f'Token record ID mismatch: expected {record_id}, got {msg_record_id}')
+        return False, 'invalid'
+
+    # Verify token type matches
+    if msg_token_type != token_type:
+        _logger.warning(f'Token type mismatch: expected {token_type}, got {msg_token_type}')
+        return False, 'invalid'
+
+    # Constant-time comparison to prevent timing attacks
+    expected_signature = compute_hmac_signature(secret_key, message)
+    if not secrets.compare_digest(received_signature, expected_signature):
+        _logger.warning(f'HMAC signature verification failed for record {record_id}')
+        return False, 'tampered'
+
+    return True, 'valid'
+
+
+# Per-process throttle for audit rows written on failed token checks, so a
+# scanner hammering the signature pages cannot flood the audit log
+AUDIT_THROTTLE_SECONDS = 60
+_AUDIT_THROTTLE_SIZE = 1024
+_audit_throttle = OrderedDict()
+_audit_throttle_lock = threading.Lock()
+
+
+def should_log_security_event(key: tuple, window: int = AUDIT_THROTTLE_SECONDS) -> bool:
+    """Return True at most once per ``window`` seconds for the given key.
+
+    Args:
+        key: Hashable event key (e.g. database, model, record id, event type)
+        window: Throttle window in seconds
+
+    Returns:
+        bool: True if the event should be written to the audit log
+    """
+    now = time.monotonic()
+    with _audit_throttle_lock:
+        last = _audit_throttle.get(key)
+        if last is not None and now - last < window:
+            return False
+        _audit_throttle[key] = now
+        _audit_throttle.move_to_end(key)
+        if len(_audit_throttle) > _AUDIT_THROTTLE_SIZE:
+            _audit_throttle.popitem(last=False)
+        return True
+
+
+@lru_cache(maxsize=64)
+def _parse_int_param(key: str, value: str, default: int) -> int:
+    """Parse an integer system parameter, once per distinct raw value.
+
+    Returns:
+        int: Parsed value, or default when empty, invalid or negative
+    """
+    if not value:
+        return default
+    try:
+        parsed = int(value)
+    except ValueError:
+        parsed = -1
+    if parsed < 0:
+        _logger.warning(f'Invalid value {value!r} for {key}, using {default}')
+        return default
+    return parsed
+
+
+# Redis connection pools shared by all helper instances of this process,
+# keyed by connection settings so configuration changes get a fresh pool.
+# Replies are left undecoded: the rate-limit scripts only return integers.
+_redis_pools = {}
+_redis_pools_lock = threading.Lock()
+
+
+def _get_redis_pool(host, port, db, password, max_connections, timeout, unix_socket_path=None):
+    """Return the process-wide Redis connection pool for these settings.
+
+    When a Unix socket path is given, the pool connects through it instead
+    of TCP (host and port are then ignored).
+
+    Returns:
+        redis.ConnectionPool: Shared connection pool
+    """
+    key = (host, port, db, password, max_connections, timeout, unix_socket_path)
+    pool = _redis_pools.get(key)
+    if pool is not None:
+        return pool
+
+    with _redis_pools_lock:
+        pool = _redis_pools.get(key)
+        if pool is None and unix_socket_path:
+            pool = redis.ConnectionPool(
+                connection_class=redis.UnixDomainSocketConnection,
+                path=unix_socket_path,
+                db=db,
+                password=password,
+                max_connections=max_connections,
+                socket_connect_timeout=timeout,
+                socket_timeout=timeout,
+            )
+            _redis_pools[key] = pool
+            _logger.info(f'Redis connection pool created: unix://{unix_socket_path}/{db}')
+        elif pool is None:
+            keepalive_options = {
+                getattr(socket, option): value
+                for option, value in (('TCP_KEEPIDLE', 30), ('TCP_KEEPINTVL', 10), ('TCP_KEEPCNT', 3))
+                if hasattr(socket, option)
+            }
+            pool = redis.ConnectionPool(
+                host=host,
+                port=port,
+                db=db,
+                password=password,
+                max_connections=max_connections,
+                socket_connect_timeout=timeout,
+                socket_timeout=timeout,
+                socket_keepalive=True,
+                socket_keepalive_options=keepalive_options,
+            )
+            _redis_pools[key] = pool
+            _logger.info(f'Redis connection pool created: {host}:{port}/{db}')
+    return pool
+
+
 class SignatureSecurityHelper:
     """Redis-based rate limiting for signature endpoints.
 
@@ -32,8 +326,11 @@ class SignatureSecurityHelper:
         - school_asset.redis_port (default: 6379)
         - school_asset.redis_db (default: 0)
         - school_asset.redis_password (optional)
+        - school_asset.redis_pool_size (default: 32)
+        - school_asset.redis_unix_socket_path (optional, used instead of host/port)
         - school_asset.rate_limit_requests (default: 10)
         - school_asset.rate_limit_window_seconds (default: 3600)
+        - school_asset.rate_limit_algo (default: zset; 'counter' for a fixed window)
     """
 
     # Default configuration
@@ -42,6 +339,35 @@ class SignatureSecurityHelper:
     REDIS_KEY_PREFIX = 'school_asset:rate_limit'
     REDIS_CONNECTION_TIMEOUT = 2  # seconds
 
+    # Sliding-window check-and-record in one server-side step.
+    # KEYS[1]: rate limit key
+    # ARGV: cutoff timestamp, now timestamp, max attempts, window seconds
+    # Returns {allowed (0/1), attempts already in window}
+    RATE_LIMIT_SCRIPT = """
+        redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+        local count = redis.call('ZCARD', KEYS[1])
+        if count >= tonumber(ARGV[3]) then
+            return {0, count}
+        end
+        redis.call('ZADD', KEYS[1], ARGV[2], ARGV[2] .. '_' .. count)
+        redis.call('EXPIRE', KEYS[1], ARGV[4])
+        return {1, count}
+    """
+    # Fixed-window counter: one integer key per IP and endpoint.
+    # KEYS[1]: rate limit key
+    # ARGV: window seconds, max attempts
+    # Returns {allowed (0/1), attempts already in window}
+    RATE_LIMIT_COUNTER_SCRIPT = """
+        local count = redis.call('INCR', KEYS[1])
+        if count == 1 then
+            redis.call('EXPIRE', KEYS[1], ARGV[1])
+        end
+        if count > tonumber(ARGV[2]) then
+            return {0, count - 1}
+        end
+        return {1, count - 1}
+    """
+
     def __init__(self, env):
         """Initialize Redis connection with fallback mechanism.
 
@@ -51,6 +377,7 @@ class SignatureSecurityHelper:
         self.env = env
         self._redis_client = None
         self._redis_available = REDIS_AVAILABLE
+        self._rate_limit_scripts = {}
 
     def _get_config_param(self, key: str, default: str = '') -> str:
         """Get configuration parameter from ir.config_parameter.
@@ -68,8 +395,27 @@ class SignatureSecurityHelper:
             _logger.error(f'Error retrieving config parameter {key}: {e}')
             return default
 
+    def _get_int_param(self, key: str, default: int) -> int:
+        """Get an integer configuration parameter.
+
+        Invalid values fall back to the default instead of failing the
+        request; each distinct raw value is parsed and validated only once.
+
+        Args:
+            key: Configuration parameter key
+            default: Value used when the parameter is missing or invalid
+
+        Returns:
+            int: Configuration value
+        """
+        return _parse_int_param(key, self._get_config_param(key, ''), default)
+
     def _get_redis_client(self) -> Optional[redis.Redis]:
-        """Get Redis client with connection pooling.
+        """Get Redis client backed by the shared per-process connection pool.
+
+        No ping is issued: dead connections surface as errors on the actual
+        command, which callers already handle (fail-open), and the pool
+        reconnects on the next call.
 
         Returns:
             redis.Redis: Redis client instance or None if unavailable
@@ -77,47 +423,20 @@ class SignatureSecurityHelper:
         if not self._redis_available:
             return None
 
-        # Return existing connection if available
         if self._redis_client is not None:
-            try:
-                # Test connection
-                self._redis_client.ping()
-                return self._redis_client
-            except (redis.ConnectionError, redis.TimeoutError) as e:
-                _logger.warning(f'Redis connection lost: {e}')
-                self._redis_client = None
-
-        # Create new connection
-        try:
-            redis_host = self._get_config_param('school_asset.redis_host', 'localhost')
-            redis_port = int(self._get_config_param('school_asset.redis_port', '6379'))
-            redis_db = int(self._get_config_param('school_asset.redis_db', '0'))
-            redis_password = self._get_config_param('school_asset.redis_password', '')
-
-            connection_kwargs = {
-                'host': redis_host,
-                'port': redis_port,
-                'db': redis_db,
-                'socket_connect_timeout': self.REDIS_CONNECTION_TIMEOUT,
-                'socket_timeout': self.REDIS_CONNECTION_TIMEOUT,
-                'decode_responses': True,
-            }
-
-            if redis_password:
-                connection_kwargs['password'] = redis_password
-
-            self._redis_client = redis.Redis(**connection_kwargs)
-
-            # Test connection
-            self._redis_client.ping()
-            _logger.info(f'Redis connection established: {redis_host}:{redis_port}/{redis_db}')
-
             return self._redis_client
 
-        except (redis.ConnectionError, redis.TimeoutError, ValueError) as e:
-            _logger.warning(f'Failed to connect to Redis: {e}. Using fallback mode.')
-            self._redis_client = None
-            return None
+        redis_host = self._get_config_param('school_asset.redis_host', 'localhost')
+        redis_port = self._get_int_param('school_asset.redis_port', 6379)
+        redis_db = self._get_int_param('school_asset.redis_db', 0)
+        redis_password = self._get_config_param('school_asset.redis_password', '')
+        pool_size = self._get_int_param('school_asset.redis_pool_size', 32)
+        unix_socket_path = self._get_config_param('school_asset.redis_unix_socket_path', '')
+
+        pool = _get_redis_pool(redis_host, redis_port, redis_db, redis_password or None, pool_size,
+                               self.REDIS_CONNECTION_TIMEOUT, unix_socket_path or None)
+        self._redis_client = redis.Redis(connection_pool=pool)
+        return self._redis_client
 
     def _get_redis_key(self, ip_address: str, endpoint: str = 'signature') -> str:
         """Generate Redis key for rate limiting.
@@ -145,19 +464,25 @@ class SignatureSecurityHelper:
             Tuple[bool, int]: (is_allowed, attempts_remaining)
                 - is_allowed: True if request is within limit
                 - attempts_remaining: Number of remaining attempts
+        """
+        return self.check_rate_limits(ip_address, [endpoint])[endpoint]
+
+    @api.model
+    def check_rate_limits(self, ip_address: str, endpoints: List[str]) -> Dict[str, Tuple[bool, int]]:
+        """Check several endpoints' rate limits for one client in one round-trip.
+
+        Args:
+            ip_address: Client IP address
+            endpoints: API endpoints being accessed
 
-        Raises:
-            UserError: If rate limit is exceeded (for user-facing endpoints)
+        Returns:
+            Dict[str, Tuple[bool, int]]: (is_allowed, attempts_remaining) per endpoint
         """
         # Get rate limit configuration
-        max_attempts = int(self._get_config_param(
-            'school_asset.rate_limit_requests',
-            str(self.DEFAULT_MAX_ATTEMPTS)
-        ))
-        window_seconds = int(self._get_config_param(
-            'school_asset.rate_limit_window_seconds',
-            str(self.DEFAULT_WINDOW_SECONDS)
-        ))
+        max_attempts = self._get_int_param('school_asset.rate_limit_requests', self.DEFAULT_MAX_ATTEMPTS)
+        window_seconds = self._get_int_param('school_asset.rate_limit_window_seconds', self.DEFAULT_WINDOW_SECONDS)
+        algorithm = self._get_config_param('school_asset.rate_limit_algo', 'zset')
+        fail_open = dict.fromkeys(endpoints, (True, max_attempts - 1))
 
         # Get Redis client
         redis_client = self._get_redis_client()
@@ -167,30 +492,48 @@ class SignatureSecurityHelper:
             _logger.warning(
                 f'Rate limiting unavailable (Redis down). Allowing request from {ip_address}'
             )
-            return True, max_attempts - 1
+            return fail_open
 
         try:
-            redis_key = self._get_redis_key(ip_address, endpoint)
-            now_timestamp = int(datetime.now().timestamp())
+            now_timestamp = int(time.time())
             cutoff_timestamp = now_timestamp - window_seconds
 
-            # Use Redis pipeline for atomic operations
-            pipe = redis_client.pipeline()
-
-            # Remove old attempts (older than window)
-            pipe.zremrangebyscore(redis_key, '-inf', cutoff_timestamp)
+            # Check and record atomically in one round-trip; scripts are loaded
+            # once and then invoked via EVALSHA
+            if algorithm == 'counter':
+                # Fixed window: O(1) and one integer per key
+                script_source = self.RATE_LIMIT_COUNTER_SCRIPT
+                key_suffix = ':counter'
+                args = [window_seconds, max_attempts]
+            else:
+                # Sliding window: prune, count, record and refresh the TTL
+                script_source = self.RATE_LIMIT_SCRIPT
+                key_suffix = ''
+                args = [cutoff_timestamp, now_timestamp, max_attempts, window_seconds]
+            script = self._rate_limit_scripts.get(algorithm)
+            if script is None:
+                script = self._rate_limit_scripts[algorithm] = redis_client.register_script(script_source)
+
+            keys = [self._get_redis_key(ip_address, endpoint) + key_suffix for endpoint in endpoints]
+            if len(keys) == 1:
+                replies = [script(keys=keys, args=args, client=redis_client)]
+            else:
+                # Several endpoints share a single pipeline round-trip
+                pipe = redis_client.pipeline(transaction=False)
+                for redis_key in keys:
+                    script(keys=[redis_key], args=args, client=pipe)
+                replies = pipe.execute()
 
-            # Count current attempts in window
-            pipe.zcard(redis_key)
-
-            # Execute pipeline
-            pipe.execute()
+        except Exception as e:
+            _logger.error(f'Error checking rate limit: {e}. Allowing request (fail-open).')
+            return fail_open
 
-            # Get current attempt count
-            current_attempts = redis_client.zcard(redis_key)
+        results = {}
+        for endpoint, (allowed, current_attempts) in zip(endpoints, replies):
+            current_attempts = int(current_attempts)
 
             # Check if limit exceeded
-            if current_attempts >= max_attempts:
+            if not int(allowed):
                 _logger.warning(
                     f'Rate limit exceeded for IP {ip_address} on endpoint {endpoint}. '
                     f'Attempts: {current_attempts}/{max_attempts}'
@@ -199,16 +542,8 @@ class SignatureSecurityHelper:
                 # Log to security audit
                 self._log_rate_limit_exceeded(ip_address, endpoint, current_attempts)
 
-                return False, 0
-
-            # Record this attempt (use timestamp as both score and member for uniqueness)
-            redis_client.zadd(
-                redis_key,
-                {f'{now_timestamp}_{current_attempts}': now_timestamp}
-            )
-
-            # Set expiration (TTL) to auto-cleanup
-            redis_client.expire(redis_key, window_seconds)
+                results[endpoint] = (False, 0)
+                continue
 
             attempts_remaining = max_attempts - current_attempts - 1
 
@@ -218,11 +553,9 @@ class SignatureSecurityHelper:
                 f'Remaining: {attempts_remaining}'
             )
 
-            return True, attempts_remaining
+            results[endpoint] = (True, attempts_remaining)
 
-        except Exception as e:
-            _logger.error(f'Error checking rate limit: {e}. Allowing request (fail-open).')
-            return True, max_attempts - 1
+        return results
 
     def _log_rate_limit_exceeded(self, ip_address: str, endpoint: str, attempts: int):
         """Log rate limit exceeded event to security audit.
@@ -232,6 +565,11 @@ class SignatureSecurityHelper:
             endpoint: API endpoint
             attempts: Number of attempts
         """
+        # A blocked client keeps hammering the endpoint; one audit row per
+        # IP/endpoint/minute is enough and keeps DB writes off the flood
+        if not should_log_security_event((self.env.cr.dbname, 'rate_limit_exceeded', ip_address, endpoint)):
+            return
+
         try:
             self.env['asset.security.audit.log'].sudo().log_security_event(
                 event_type='rate_limit_exceeded',
@@ -7,13 +7,24 @@ Adds watermarks to signature images to prevent unauthorized use
 import io
 import os
 import base64
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from PIL import Image, ImageDraw, ImageFont, ImageEnhance
 from datetime import datetime
 
 _logger = logging.getLogger(__name__)
 
+# Watermarked output and previews are pure functions of their inputs, so recently
+# rendered images are kept in a small per-process LRU keyed by a digest of the signature
+WATERMARK_CACHE_SIZE = 256
+_watermark_cache = OrderedDict()
+_watermark_cache_lock = threading.Lock()
 
+
+@lru_cache(maxsize=1)
 def _get_font_path():
     """
     Get bundled font path from module
@@ -51,7 +62,108 @@ def _get_font_path():
     return None
 
 
+@lru_cache(maxsize=64)
+def _load_font(font_path, size):
+    """
+    Load a font once per (path, size); FreeType fonts are reusable across images
+
+    Args:
+        font_path: TrueType font path, or None for the PIL default font
+        size: Font size in pixels
+
+    Returns:
+        ImageFont: Loaded font
+    """
+    if font_path:
+        return ImageFont.truetype(font_path, size)
+    return ImageFont.load_default()
+
+
 def add_watermark_to_signature(signature_data, watermark_text="SCHOOL USE ONLY", reference_number="", timestamp=None):
+    """
+    Add watermark to signature image, reusing a cached result when the same
+    signature was already rendered with the same text, reference and timestamp
+
+    Args:
+        signature_data: Base64 encoded signature image
+        watermark_text: Main watermark text (default: "SCHOOL USE ONLY")
+        reference_number: Document reference number to include
+        timestamp: Signature timestamp (datetime object)
+
+    Returns:
+        Base64 encoded watermarked image
+    """
+    if not signature_data:
+        return signature_data
+
+    # Only minutes are printed, so renders within the same minute are identical
+    if isinstance(timestamp, datetime):
+        timestamp = timestamp.replace(second=0, microsecond=0)
+    key = (_digest(signature_data), watermark_text, reference_number, timestamp)
+
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+
+    result = _render_watermark(signature_data, watermark_text, reference_number, timestamp)
+
+    # Do not cache the fallback (original image returned on error)
+    if result is not signature_data:
+        _cache_put(key, result)
+    return result
+
+
+def _digest(signature_data):
+    """Return a short content digest of base64 signature data, used as cache key"""
+    raw = signature_data.encode() if isinstance(signature_data, str) else bytes(signature_data)
+    return hashlib.blake2b(raw, digest_size=16).digest()
+
+
+def _cache_get(key):
+    """Return a cached rendering and mark it as recently used, or None"""
+    with _watermark_cache_lock:
+        cached = _watermark_cache.get(key)
+        if cached is not None:
+            _watermark_cache.move_to_end(key)
+        return cached
+
+
+def _cache_put(key, value):
+    """Store a rendering, evicting the least recently used beyond the cache size"""
+    with _watermark_cache_lock:
+        _watermark_cache[key] = value
+        if len(_watermark_cache) > WATERMARK_CACHE_SIZE:
+            _watermark_cache.popitem(last=False)
+
+
+@lru_cache(maxsize=32)
+def _render_stamp(text, font):
+    """
+    Render the faint diagonal main-text tile, once per (text, font)
+
+    Only the text's own bounding box is rasterised and rotated, not a
+    full-size layer. Fonts come from the _load_font cache, so signatures of
+    the same height share one tile.
+
+    Args:
+        text: Main watermark text
+        font: Font used for the main text
+
+    Returns:
+        PIL.Image: Rotated RGBA tile (read-only, shared)
+    """
+    # Calculate text size using textbbox
+    left, top, right, bottom = ImageDraw.Draw(Image.new('RGBA', (1, 1))).textbbox((0, 0), text, font=font)
+    tile = Image.new('RGBA', (max(right - left, 1), max(bottom - top, 1)), (255, 255, 255, 0))
+
+    # Draw with semi-transparent red
+    ImageDraw.Draw(tile).text((-left, -top), text, fill=(255, 0, 0, 60), font=font)
+
+    # Rotate the tile, growing it to fit
+    return tile.rotate(-20, expand=True)
+
+
+def _render_watermark(signature_data, watermark_text="SCHOOL USE ONLY", reference_number="", timestamp=None):
     """
     Add watermark to signature image
 
@@ -69,103 +181,100 @@ def add_watermark_to_signature(signature_data, watermark_text="SCHOOL USE ONLY",
 
     try:
         # Decode image
-        image_data = base64.b64decode(signature_data)
-        image = Image.open(io.BytesIO(image_data))
+        image = Image.open(io.BytesIO(base64.b64decode(signature_data)))
+        image = _apply_watermark(image, watermark_text, reference_number, timestamp)
+        return _encode_png(image)
+
+    except Exception as e:
+        # If watermarking fails, return original
+        _logger.error(f'Watermark error: {e}', exc_info=True)
+        return signature_data
+
+
+def _encode_png(image, compress_level=3):
+    """
+    Encode a PIL image as base64 PNG
 
-        # Convert to RGBA if needed
+    Args:
+        image: PIL image
+        compress_level: zlib level; low levels encode much faster and
+            barely grow these flat, mostly white images
+
+    Returns:
+        bytes: Base64 encoded PNG
+    """
+    output = io.BytesIO()
+    image.save(output, format='PNG', compress_level=compress_level)
+    # Encode straight from the buffer's memory instead of copying it out first
+    with output.getbuffer() as png:
+        return base64.b64encode(png)
+
+
+def _apply_watermark(image, watermark_text="SCHOOL USE ONLY", reference_number="", timestamp=None):
+    """
+    Watermark a decoded signature image
+
+    Args:
+        image: PIL image of the signature
+        watermark_text: Main watermark text (default: "SCHOOL USE ONLY")
+        reference_number: Document reference number to include
+        timestamp: Signature timestamp (datetime object)
+
+    Returns:
+        PIL.Image: Watermarked RGB image
+    """
+    # Flatten onto white once up front; the output is RGB anyway, and
+    # everything below blends straight into this single buffer
+    if image.mode == 'RGB':
+        image.load()
+    else:
         if image.mode != 'RGBA':
             image = image.convert('RGBA')
+        rgb_image = Image.new('RGB', image.size, (255, 255, 255))
+        rgb_image.paste(image, mask=image.getchannel('A'))
+        image = rgb_image
 
-        # Create watermark layer
-        watermark = Image.new('RGBA', image.size, (255, 255, 255, 0))
-        draw = ImageDraw.Draw(watermark)
-
-        # Get image dimensions
-        width, height = image.size
-
-        # Load font with error handling
-        try:
-            font_path = _get_font_path()
-            if font_path:
-                font_large = ImageFont.truetype(font_path, int(height * 0.15))
-                font_small = ImageFont.truetype(font_path, int(height * 0.08))
-            else:
-                _logger.warning('Using PIL default font for watermark (may look poor)')
-                font_large = ImageFont.load_default()
-                font_small = ImageFont.load_default()
-        except Exception as e:
-            _logger.error(f'Error loading font: {e}, using default font')
-            font_large = ImageFont.load_default()
-            font_small = ImageFont.load_default()
-
-        # Draw diagonal "SCHOOL USE ONLY" watermark (large, faint)
-        main_text = watermark_text
-
-        # Create rotated text layer for diagonal watermark
-        txt_layer = Image.new('RGBA', image.size, (255, 255, 255, 0))
-        txt_draw = ImageDraw.Draw(txt_layer)
-
-        # Calculate text size using textbbox
-        bbox = txt_draw.textbbox((0, 0), main_text, font=font_large)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-
-        # Draw text in center
-        x = (width - text_width) // 2
-        y = (height - text_height) // 2
-
-        # Draw with semi-transparent red
-        txt_draw.text((x, y), main_text, fill=(255, 0, 0, 60), font=font_large)
-
-        # Rotate the text layer
-        txt_layer = txt_layer.rotate(-20, expand=False)
-
-        # Composite the rotated text onto watermark
-        watermark = Image.alpha_composite(watermark, txt_layer)
-
-        # Draw reference number and timestamp at bottom (small, readable)
-        info_y = height - int(height * 0.12)
-
-        if reference_number:
-            ref_text = f"Ref: {reference_number}"
-            draw = ImageDraw.Draw(watermark)
-            draw.text((10, info_y), ref_text, fill=(80, 80, 80, 180), font=font_small)
-
-        if timestamp:
-            if isinstance(timestamp, str):
-                time_text = timestamp
-            else:
-                time_text = timestamp.strftime("%Y-%m-%d %H:%M")
-            draw = ImageDraw.Draw(watermark)
-
-            # Calculate text width for right alignment
-            bbox = draw.textbbox((0, 0), time_text, font=font_small)
-            time_width = bbox[2] - bbox[0]
-
-            draw.text((width - time_width - 10, info_y), time_text,
-                     fill=(80, 80, 80, 180), font=font_small)
-
-        # Composite watermark onto original image
-        watermarked = Image.alpha_composite(image, watermark)
-
-        # Convert back to RGB for JPEG
-        if watermarked.mode == 'RGBA':
-            rgb_image = Image.new('RGB', watermarked.size, (255, 255, 255))
-            rgb_image.paste(watermarked, mask=watermarked.split()[3])
-            watermarked = rgb_image
-
-        # Save to bytes
-        output = io.BytesIO()
-        watermarked.save(output, format='PNG', quality=95)
-        output.seek(0)
-
-        # Encode to base64
-        return base64.b64encode(output.getvalue())
+    # Get image dimensions
+    width, height = image.size
 
+    # Load font with error handling
+    try:
+        font_path = _get_font_path()
+        font_large = _load_font(font_path, int(height * 0.15))
+        font_small = _load_font(font_path, int(height * 0.08))
     except Exception as e:
-        # If watermarking fails, return original
-        _logger.error(f'Watermark error: {e}', exc_info=True)
-        return signature_data
+        _logger.error(f'Error loading font: {e}, using default font')
+        font_large = ImageFont.load_default()
+        font_small = ImageFont.load_default()
+
+    # Diagonal "SCHOOL USE ONLY" watermark (large, faint), centred and blended
+    # using the cached tile's own alpha as the mask
+    tile = _render_stamp(watermark_text, font_large)
+    image.paste(tile, ((width - tile.width) // 2, (height - tile.height) // 2), tile)
+
+    # Draw reference number and timestamp at bottom (small, readable);
+    # an RGBA draw on an RGB image blends the semi-transparent fill
+    draw = ImageDraw.Draw(image, 'RGBA')
+    info_y = height - int(height * 0.12)
+
+    if reference_number:
+        ref_text = f"Ref: {reference_number}"
+        draw.text((10, info_y), ref_text, fill=(80, 80, 80, 180), font=font_small)
+
+    if timestamp:
+        if isinstance(timestamp, str):
+            time_text = timestamp
+        else:
+            time_text = timestamp.strftime("%Y-%m-%d %H:%M")
+
+        # Calculate text width for right alignment
+        bbox = draw.textbbox((0, 0), time_text, font=font_small)
+        time_width = bbox[2] - bbox[0]
+
+        draw.text((width - time_width - 10, info_y), time_text,
+                 fill=(80, 80, 80, 180), font=font_small)
+
+    return image
 
 
 def create_signature_preview(signature_data, max_width=400, max_height=150):
@@ -183,25 +292,28 @@ def create_signature_preview(signature_data, max_width=400, max_height=150):
     if not signature_data:
         return signature_data
 
+    # The same signature is often shown on many list rows
+    key = (_digest(signature_data), 'preview', max_width, max_height)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+
     try:
         # Decode image
-        image_data = base64.b64decode(signature_data)
-        image = Image.open(io.BytesIO(image_data))
-
-        # Resize maintaining aspect ratio
-        image.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
+        image = Image.open(io.BytesIO(base64.b64decode(signature_data)))
 
-        # Save to bytes
-        output = io.BytesIO()
-        image.save(output, format='PNG', quality=90)
-        output.seek(0)
+        # Let JPEG inputs decode at a reduced DCT scale (no-op for PNG), then
+        # resize maintaining aspect ratio with a cheap pre-reduction step
+        image.draft('RGB', (max_width * 2, max_height * 2))
+        image.thumbnail((max_width, max_height), Image.Resampling.LANCZOS, reducing_gap=2.0)
 
-        # Encode to base64
-        preview_data = base64.b64encode(output.getvalue())
-
-        # Add watermark to preview
-        return add_watermark_to_signature(preview_data, watermark_text="PREVIEW")
+        # Watermark the resized image and encode once; previews are
+        # transient, so favour encode speed over size
+        preview = _encode_png(_apply_watermark(image, watermark_text="PREVIEW"), compress_level=1)
 
     except Exception as e:
         _logger.error(f'Preview error: {e}', exc_info=True)
         return signature_data
+
+    _cache_put(key, preview)
+    return preview
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestAssignmentState(TransactionCase):
+    """state is a stored mirror of status on the assignment models"""
+
+    STATUSES = ('draft', 'checked_out', 'checked_in', 'cancelled')
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.teacher = cls.env['hr.employee'].create({'name': 'State Test Teacher'})
+        cls.assignments = cls.env['asset.teacher.assignment'].create([
+            {'teacher_id': cls.teacher.id, 'status': status}
+            for status in cls.STATUSES
+        ])
+
+    def _stored_states(self, assignments):
+        assignments.flush_recordset()
+        self.env.cr.execute(
+            f"SELECT id, status, state FROM {assignments._table} WHERE id = ANY(%s)",
+            [assignments.ids],
+        )
+        return {row[0]: (row[1], row[2]) for row in self.env.cr.fetchall()}
+
+    def test_state_follows_status(self):
+        for status, state in self._stored_states(self.assignments).values():
+            self.assertEqual(state, status)
+
+        self.assignments.write({'status': 'checked_in'})
+        for status, state in self._stored_states(self.assignments).values():
+            self.assertEqual((status, state), ('checked_in', 'checked_in'))
+
+    def test_init_realigns_stale_state(self):
+        Assignment = self.env['asset.teacher.assignment']
+        # Simulate rows written while state was a separate column
+        self.env.cr.execute(
+            f"UPDATE {Assignment._table} SET state = 'draft' WHERE id = ANY(%s)",
+            [self.assignments.ids],
+        )
+        Assignment.init()
+        self.assignments.invalidate_recordset(['state'])
+
+        stored = self._stored_states(self.assignments)
+        for assignment, status in zip(self.assignments, self.STATUSES):
+            self.assertEqual(stored[assignment.id], (status, status))
+            self.assertEqual(assignment.state, status)
+
+        # Employee counts filter active assignments on state
+        self.teacher.invalidate_recordset(['asset_assignment_count'])
+        self.assertEqual(self.teacher.asset_assignment_count, 2)
@@ -1,8 +1,17 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api, _
+from odoo import models, fields, _
 from odoo.exceptions import UserError
 
+WITHDRAWAL_REASONS = [
+    ('no_longer_needed', 'No longer need the service'),
+    ('privacy_concern', 'Privacy concerns'),
+    ('found_alternative', 'Found alternative service'),
+    ('not_satisfied', 'Not satisfied with data handling'),
+    ('other', 'Other reason'),
+]
+_WITHDRAWAL_REASON_LABELS = dict(WITHDRAWAL_REASONS)
+
 
 class ConsentWithdrawalWizard(models.TransientModel):
     """
@@ -42,13 +51,7 @@ class ConsentWithdrawalWizard(models.TransientModel):
         readonly=True
     )
 
-    withdrawal_reason = fields.Selection([
-        ('no_longer_needed', 'No longer need the service'),
-        ('privacy_concern', 'Privacy concerns'),
-        ('found_alternative', 'Found alternative service'),
-        ('not_satisfied', 'Not satisfied with data handling'),
-        ('other', 'Other reason'),
-    ], string='Reason for Withdrawal', required=True)
+    withdrawal_reason = fields.Selection(WITHDRAWAL_REASONS, string='Reason for Withdrawal', required=True)
 
     withdrawal_reason_text = fields.Text(
         string='Additional Details',
@@ -61,62 +64,6 @@ class ConsentWithdrawalWizard(models.TransientModel):
         help='Withdrawing consent may limit our ability to provide certain services'
     )
 
-    # Consequences warning
-    consequences = fields.Html(
-        string='Consequences',
-        compute='_compute_consequences',
-        readonly=True
-    )
-
-    @api.depends('consent_type')
-    def _compute_consequences(self):
-        """Show consequences of withdrawing specific consent types"""
-        for wizard in self:
-            consequences_map = {
-                'data_collection': '''
-                    <div class="alert alert-warning">
-                        <strong>⚠️ Important:</strong>
-                        <ul>
-                            <li>Your assignment records will be anonymized</li>
-                            <li>You may not be able to borrow school assets in the future</li>
-                            <li>Historical records will be retained for legal compliance</li>
-                        </ul>
-                    </div>
-                ''',
-                'digital_signature': '''
-                    <div class="alert alert-warning">
-                        <strong>⚠️ Important:</strong>
-                        <ul>
-                            <li>Existing signed documents will remain valid</li>
-                            <li>Future transactions will require paper-based signatures</li>
-                            <li>This may delay processing times</li>
-                        </ul>
-                    </div>
-                ''',
-                'email_communication': '''
-                    <div class="alert alert-warning">
-                        <strong>⚠️ Important:</strong>
-                        <ul>
-                            <li>You will no longer receive email notifications</li>
-                            <li>Important updates must be collected in person</li>
-                            <li>This may result in missed deadlines</li>
-                        </ul>
-                    </div>
-                ''',
-                'all': '''
-                    <div class="alert alert-danger">
-                        <strong>🚨 Critical:</strong>
-                        <ul>
-                            <li>All services requiring personal data will be terminated</li>
-                            <li>You will need to return all borrowed assets immediately</li>
-                            <li>Your account will be deactivated</li>
-                            <li>Historical records retained only for legal compliance</li>
-                        </ul>
-                    </div>
-                ''',
-            }
-            wizard.consequences = consequences_map.get(wizard.consent_type, '')
-
     def action_confirm_withdrawal(self):
         """Confirm and process consent withdrawal"""
         self.ensure_one()
@@ -125,33 +72,30 @@ class ConsentWithdrawalWizard(models.TransientModel):
             raise UserError(_('Please confirm that you understand the consequences of withdrawing consent.'))
 
         # Build withdrawal reason message
-        reason_text = dict(self._fields['withdrawal_reason'].selection).get(self.withdrawal_reason)
-        full_reason = f"{reason_text}"
-        if self.withdrawal_reason_text:
-            full_reason += f"\n\nDetails: {self.withdrawal_reason_text}"
+        reason_text = _WITHDRAWAL_REASON_LABELS.get(self.withdrawal_reason)
+        details = (self.withdrawal_reason_text or '').strip()
+        full_reason = f"{reason_text}\n\nDetails: {details}" if details else reason_text
+
+        # Load everything the log is needed for below in one query
+        log = self.consent_log_id
+        log.fetch(['student_assignment_id', 'teacher_assignment_id', 'data_subject_name'])
+        student_assignment = log.student_assignment_id
+        teacher_assignment = log.teacher_assignment_id
+        data_subject_name = log.data_subject_name
 
         # Withdraw consent
-        self.consent_log_id._withdraw_consent(reason=full_reason)
-
-        # Log in related assignment
-        if self.consent_log_id.student_assignment_id:
-            self.consent_log_id.student_assignment_id.message_post(
-                body=_('⚠️ Consent withdrawn by %s on %s. Reason: %s') % (
-                    self.data_subject_name,
-                    fields.Datetime.now().strftime('%Y-%m-%d %H:%M'),
-                    reason_text
-                ),
-                subject=_('Consent Withdrawn')
-            )
-        elif self.consent_log_id.teacher_assignment_id:
-            self.consent_log_id.teacher_assignment_id.message_post(
-                body=_('⚠️ Consent withdrawn by %s on %s. Reason: %s') % (
-                    self.data_subject_name,
-                    fields.Datetime.now().strftime('%Y-%m-%d %H:%M'),
-                    reason_text
-                ),
-                subject=_('Consent Withdrawn')
-            )
+        log._withdraw_consent(reason=full_reason)
+
+        # Log in related assignment(s); a plain log entry, nobody is notified
+        body = _('⚠️ Consent withdrawn by %s on %s. Reason: %s') % (
+            data_subject_name,
+            fields.Datetime.now().strftime('%Y-%m-%d %H:%M'),
+            reason_text
+        )
+        subject = _('Consent Withdrawn')
+        for assignment in (student_assignment, teacher_assignment):
+            if assignment:
+                assignment._message_log(body=body, subject=subject)
 
         # Show confirmation message
         return {